@@ -0,0 +1,183 @@
+import math
+
+import numpy as np
+
+from hill_climb import DRIVER_HEAD, FLIP_ANGLE, Car, Terrain, generate_coins
+
+def per_wheel(value):
+    # A per-car parameter as a column against the (cars, wheels) arrays; a single value stays as it is
+    value = np.asarray(value, dtype=float)
+    return value[:, None] if value.ndim else value
+
+class BatchCars:
+    # Steps many cars at once with the same physics as Car.update, holding
+    # every per-car value in a NumPy array instead of a Car object
+    def __init__(self, count, terrain, span=20000):
+        self.count = count
+        self.terrain = terrain
+
+        # Every car drives over the same terrain, sampled once at its point spacing
+        # Past the end of the span the ground stays flat
+        self.segment_length = terrain.segment_length
+        num_points = int(span // self.segment_length) + 1
+        self.heights = np.asarray(terrain.get_heights(np.arange(num_points) * self.segment_length), dtype=float)
+
+        # Coins on the span, shared by all cars, with each car collecting its own
+        coins = []
+        for index in range(int(span // terrain.chunk_width) + 1):
+            coins.extend(generate_coins(terrain, index))
+        self.coin_x = np.array([coin.x for coin in coins], dtype=float)
+        self.coin_y = np.array([coin.y for coin in coins], dtype=float)
+        self.coin_radius = np.array([coin.radius for coin in coins], dtype=float)
+
+        # Car and wheel constants come from a template car so the two engines can't drift apart
+        template = Car()
+        self.width = template.width
+        self.height = template.height
+        self.body_offset_y = template.body_offset_y
+        self.wheel_offsets = np.array([template.back_wheel.x_offset, template.front_wheel.x_offset], dtype=float)
+        self.wheel_radius = template.back_wheel.radius
+        self.suspension_height = template.back_wheel.suspension_height
+        self.start = template
+
+        # Tunable parameters, either one value for every car or an array with one per car
+        self.max_speed = template.max_speed
+        self.fuel_consumption = template.fuel_consumption
+        self.friction = template.friction
+        self.angular_damping = template.angular_damping
+        self.spring_strength = template.back_wheel.spring_strength
+        self.damping = template.back_wheel.damping
+
+        self.reset()
+
+    def reset(self):
+        n = self.count
+        start = self.start
+        self.x = np.full(n, float(start.x))
+        self.y = np.full(n, float(start.y))
+        self.angle = np.full(n, float(start.angle))
+        self.speed = np.full(n, float(start.speed))
+        self.angular_velocity = np.full(n, float(start.angular_velocity))
+        self.fuel = np.full(n, float(start.fuel))
+        self.score = np.zeros(n, dtype=int)
+        self.distance = np.zeros(n)
+        self.max_distance = np.zeros(n)
+
+        # Per-wheel state, back wheel in column 0 and front wheel in column 1
+        self.wheel_y = np.zeros((n, 2))
+        self.wheel_velocity_y = np.zeros((n, 2))
+        self.suspension_compression = np.zeros((n, 2))
+        self.wheel_rotation = np.zeros(n)
+
+        self.collected = np.zeros((n, len(self.coin_x)), dtype=bool)
+        # A car is done once it runs out of fuel, flips or lands on its roof, like World.step
+        self.done = np.zeros(n, dtype=bool)
+
+    def heights_at(self, x):
+        # Linear interpolation between the sampled terrain points
+        pos = np.clip(x / self.segment_length, 0, len(self.heights) - 1)
+        i = np.minimum(pos.astype(np.intp), len(self.heights) - 2)
+        t = pos - i
+        y1 = self.heights[i]
+        return y1 + t * (self.heights[i + 1] - y1)
+
+    def head_in_ground(self):
+        # Car.ground_events' crash test for every car at once
+        head_x, head_y = DRIVER_HEAD
+        cos = np.cos(self.angle)
+        sin = np.sin(self.angle)
+        x = self.x + self.width / 2 + head_x * cos - head_y * sin
+        y = self.y + self.height / 2 + head_x * sin + head_y * cos
+        return y > self.heights_at(x)
+
+    def step(self, gas, brake):
+        # Advance every car that isn't done by one Car.update
+        live = ~self.done
+        gas = np.asarray(gas, dtype=bool) & (self.fuel > 0)
+        brake = np.asarray(brake, dtype=bool)
+
+        # Apply gas and brake
+        acceleration = np.where(gas, 0.2, np.where(brake, -0.2, 0.0))
+        fuel = self.fuel - np.where(gas, self.fuel_consumption, 0.0)
+
+        # Update speed with friction, then limit it
+        speed = (self.speed + acceleration) * self.friction
+        speed = np.clip(speed, -self.max_speed / 2, self.max_speed)
+
+        # Move car forward based on speed and angle
+        x = self.x + speed * np.cos(self.angle)
+        distance = self.distance + np.abs(x - self.x)
+        max_distance = np.maximum(self.max_distance, x)
+
+        # Suspension physics for both wheels at once, with per-car spring values turned into
+        # columns so they apply to both of a car's wheels
+        wheel_x = x[:, None] + self.wheel_offsets
+        rest_position = self.heights_at(wheel_x) - self.wheel_radius
+        spring_displacement = rest_position - self.wheel_y
+        spring_strength = per_wheel(self.spring_strength)
+        damping = per_wheel(self.damping)
+        total_force = spring_displacement * spring_strength - self.wheel_velocity_y * damping
+        wheel_velocity_y = self.wheel_velocity_y + total_force
+        wheel_y = self.wheel_y + wheel_velocity_y
+
+        # Limit wheel position to not go below terrain, with a bounce
+        below = wheel_y > rest_position
+        wheel_y = np.where(below, rest_position, wheel_y)
+        wheel_velocity_y = np.where(below, wheel_velocity_y * -0.3, wheel_velocity_y)
+        suspension_compression = np.minimum(self.suspension_height, np.maximum(0, spring_displacement))
+
+        # Rotate towards the angle between the wheels with spring-like behavior
+        target_angle = np.arctan2(wheel_y[:, 1] - wheel_y[:, 0], wheel_x[:, 1] - wheel_x[:, 0])
+        angle_diff = (target_angle - self.angle + math.pi) % (2 * math.pi) - math.pi
+        angular_velocity = (self.angular_velocity + angle_diff * 0.1) * (1 - self.angular_damping)
+        angle = self.angle + angular_velocity
+
+        # Car body position from the wheels and suspension
+        y = wheel_y.mean(axis=1) - self.height / 2 - self.body_offset_y
+        wheel_rotation = self.wheel_rotation + np.where(np.abs(speed) > 0.1, speed / self.wheel_radius, 0.0)
+
+        # Coin collection against every coin each car hasn't collected yet
+        score = self.score
+        collected = self.collected
+        if len(self.coin_x):
+            center_x = x + self.width / 2
+            center_y = y + self.height / 2
+            distance_squared = (center_x[:, None] - self.coin_x) ** 2 + (center_y[:, None] - self.coin_y) ** 2
+            hits = ~collected & (distance_squared < (self.width / 2 + self.coin_radius) ** 2) & live[:, None]
+            collected = collected | hits
+            coin_count = hits.sum(axis=1)
+            score = score + 10 * coin_count
+            fuel = np.minimum(100, fuel + 10 * coin_count)  # Bonus fuel
+        fuel = np.maximum(fuel, 0)
+
+        # Only cars still driving take the new state
+        for name, value in (("x", x), ("y", y), ("angle", angle), ("speed", speed),
+                            ("angular_velocity", angular_velocity), ("fuel", fuel), ("score", score),
+                            ("distance", distance), ("max_distance", max_distance),
+                            ("wheel_rotation", wheel_rotation)):
+            np.copyto(getattr(self, name), value, where=live)
+        for name, value in (("wheel_y", wheel_y), ("wheel_velocity_y", wheel_velocity_y),
+                            ("suspension_compression", suspension_compression)):
+            np.copyto(getattr(self, name), value, where=live[:, None])
+        self.collected = collected
+
+        flipped = np.abs((self.angle + math.pi) % (2 * math.pi) - math.pi) > FLIP_ANGLE
+        self.done |= (self.fuel <= 0) | flipped | self.head_in_ground()
+        return self.done
+
+def simulate_batch(seed, inputs, steps=None, span=20000):
+    # Batched counterpart of hill_climb.simulate: inputs is a (steps, count, 2) array of gas/brake
+    inputs = np.asarray(inputs, dtype=bool)
+    cars = BatchCars(inputs.shape[1], Terrain(seed=seed), span=span)
+    if steps is None:
+        steps = len(inputs)
+
+    for step in range(steps):
+        if step < len(inputs):
+            done = cars.step(inputs[step, :, 0], inputs[step, :, 1])
+        else:
+            done = cars.step(False, False)
+        if done.all():
+            break
+
+    return cars
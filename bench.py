@@ -0,0 +1,228 @@
+import gc
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import platform
+from array import array
+
+# Benchmarks run without a window, under SDL's dummy video driver
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from ghost import POSE_SIZE, Ghost, GhostField
+from hill_climb import (WIDTH, HEIGHT, MAX_TERRAIN_CHUNKS, Background, Cloud, Mountain,
+                        Terrain, World, draw_ghosts, np)
+
+SEED = 1
+LAYERS = ["sky", "mountains", "clouds", "terrain", "coins", "ghosts", "car", "hud"]
+TOLERANCE = 0.15  # Fraction a metric may get worse before it counts as a regression
+QUICK_TOLERANCE = 0.3  # Quick runs are noisier
+# Changes smaller than these never count as regressions: too small a share of a frame or of a
+# terrain build to matter, and too small to measure reliably
+NOISE_FLOORS = {"ms/frame": 0.05, "ms": 1.0}
+MIN_RUN_TIME = 0.05  # Seconds a timed run should last at least
+BENCH_GHOSTS = 100  # Ghosts raced against in the ghosts layer, a few steps apart
+
+def best_time(func, repeat, setup=None):
+    # Best of several runs, which is the least disturbed by the rest of the machine, after an
+    # untimed run that warms the caches
+    # Runs quicker than MIN_RUN_TIME are repeated until they take that long, so timer noise doesn't
+    # swamp them; with a setup, each run is instead given a fresh result of it, made outside the timing
+    arguments = (setup(),) if setup is not None else ()
+    start = time.perf_counter()
+    func(*arguments)
+    number = 1 if setup is not None else max(1, math.ceil(MIN_RUN_TIME / (time.perf_counter() - start)))
+
+    # Like timeit, keep the garbage collector from landing in some runs and not others
+    times = []
+    for _ in range(repeat):
+        arguments = (setup(),) if setup is not None else ()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for _ in range(number):
+                func(*arguments)
+            times.append((time.perf_counter() - start) / number)
+        finally:
+            gc.enable()
+    return min(times)
+
+def bench_world_step(steps, repeat):
+    # A car that never runs out of fuel keeps driving forward, streaming terrain and coins all the way
+    inputs = [(i % 100 < 80, i % 100 >= 95) for i in range(steps)]
+
+    def setup():
+        world = World(SEED)
+        world.car.fuel_consumption = 0
+        return world
+
+    def run(world):
+        for gas, brake in inputs:
+            world.step(gas, brake)
+
+    return steps / best_time(run, repeat, setup)
+
+def bench_get_height(queries, repeat):
+    # Stay within the chunks the terrain keeps in memory, as the game does
+    terrain = Terrain(seed=SEED)
+    span = terrain.chunk_width * (MAX_TERRAIN_CHUNKS - 2)
+    rng = random.Random(SEED)
+    xs = [rng.uniform(0, span) for _ in range(queries)]
+    get_height = terrain.get_height
+
+    def run():
+        for x in xs:
+            get_height(x)
+
+    return queries / best_time(run, repeat)
+
+def bench_get_heights(queries, repeat):
+    terrain = Terrain(seed=SEED)
+    span = terrain.chunk_width * (MAX_TERRAIN_CHUNKS - 2)
+    xs = np.random.default_rng(SEED).uniform(0, span, queries)
+    return queries / best_time(lambda: terrain.get_heights(xs), repeat)
+
+def bench_generate_terrain(width, repeat):
+    def run():
+        terrain = Terrain(width, SEED)
+        for index in range(terrain.last_chunk + 1):
+            terrain.generate_chunk(index)
+
+    return best_time(run, repeat) * 1000
+
+def bench_layers(frames, repeat):
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+
+    # Drive a recorded-looking run so every layer draws what it would in the game
+    world = World(SEED)
+    rng = random.Random(SEED)
+    clouds = [Cloud(rng.randint(-200, WIDTH + 200), rng.randint(50, 150), rng) for _ in range(5)]
+    mountains = [Mountain(i * 300, rng.randint(100, 200), rng) for i in range(10)]
+    background = Background(mountains, clouds)
+    cameras = []
+    poses = array("f", world.car.pose())
+    for _ in range(frames):
+        world.step(True, False)
+        cameras.append(world.car.x - WIDTH // 3)
+        poses.extend(world.car.pose())
+    # Ghosts of the same run, each a few steps ahead of the one before
+    ghosts = GhostField([Ghost(SEED, memoryview(poses)[min(i * 3, frames) * POSE_SIZE:]) for i in range(BENCH_GHOSTS)])
+
+    car = world.car
+    coins = world.coins
+    layers = {
+        "sky": lambda camera_x, step: background.draw_sky(screen),
+        "mountains": lambda camera_x, step: background.draw_mountains(screen, camera_x),
+        "clouds": lambda camera_x, step: background.draw_clouds(screen, camera_x),
+        "terrain": lambda camera_x, step: world.terrain.draw(screen, camera_x),
+        "coins": lambda camera_x, step: [coin.draw(screen, camera_x) for coin in
+                                         coins.near(camera_x - coins.max_radius, camera_x + WIDTH + coins.max_radius)],
+        "ghosts": lambda camera_x, step: draw_ghosts(screen, camera_x, ghosts.visible(
+            step, 0.5, camera_x - car.width * 2, camera_x + WIDTH + car.width * 2), car),
+        "car": lambda camera_x, step: car.draw(screen, camera_x),
+        "hud": lambda camera_x, step: (car.draw_fuel_meter(screen), car.draw_score(screen)),
+    }
+
+    results = {}
+    for name in LAYERS:
+        draw = layers[name]
+
+        def run():
+            for step, camera_x in enumerate(cameras, 1):
+                draw(camera_x, step)
+
+        results[name] = best_time(run, repeat) / frames * 1000
+    return results
+
+def run_benchmarks(quick=False):
+    # Quick runs are short, so they take the best of more of them
+    scale = 10 if quick else 1
+    repeat = 7
+    results = {}
+
+    def add(name, value, unit, higher_is_better):
+        results[name] = {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+        print(f"{name:32} {value:14.3f} {unit}")
+
+    add("world_step", bench_world_step(20000 // scale, repeat), "steps/s", True)
+    add("get_height", bench_get_height(200000 // scale, repeat), "queries/s", True)
+    if np is not None:
+        add("get_heights", bench_get_heights(1000000 // scale, repeat), "queries/s", True)
+
+    widths = [10000, 100000] if quick else [10000, 100000, 1000000]
+    for width in widths:
+        add(f"generate_terrain_{width}", bench_generate_terrain(width, repeat), "ms", False)
+
+    for name, value in bench_layers(600 // scale, repeat).items():
+        add(f"draw_{name}", value, "ms/frame", False)
+
+    return results
+
+def compare(results, baseline, tolerance):
+    # Return the metrics that got worse than the baseline by more than the tolerance
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or not base["value"]:
+            continue
+
+        change = result["value"] / base["value"] - 1
+        if result["higher_is_better"]:
+            regressed = change < -tolerance
+        else:
+            regressed = change > tolerance
+        if abs(result["value"] - base["value"]) < NOISE_FLOORS.get(result["unit"], 0):
+            regressed = False
+        print(f"{name:32} {change * 100:+8.1f}%{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the physics, terrain and rendering hot paths")
+    parser.add_argument("--quick", action="store_true", help="smaller runs for a fast check")
+    parser.add_argument("--output", metavar="PATH", help="write the results as JSON to PATH")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against results saved with --output")
+    parser.add_argument("--tolerance", type=float,
+                        help="fraction a metric may get worse before it counts as a regression "
+                             f"(default: {TOLERANCE}, or {QUICK_TOLERANCE} with --quick)")
+    args = parser.parse_args()
+
+    pygame.init()
+    results = run_benchmarks(args.quick)
+    pygame.quit()
+
+    report = {
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("quick") != args.quick:
+            print("warning: baseline was recorded with a different --quick setting")
+        print()
+        tolerance = args.tolerance
+        if tolerance is None:
+            tolerance = QUICK_TOLERANCE if args.quick else TOLERANCE
+        regressions = compare(results, baseline["results"], tolerance)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import os
+import json
+import zlib
+import queue
+import struct
+import threading
+
+import pygame
+
+CAPTURE_QUEUE = 120  # Frames waiting to be written before the policy kicks in
+PNG_LEVEL = 3  # zlib level for PNG frames; higher is smaller and slower
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+def encode_png(data, width, height):
+    # A plain RGB PNG with no row filters; zlib does the work and lets go of the GIL while it does
+    stride = width * 3
+    rows = b"".join(b"\0" + data[y * stride:(y + 1) * stride] for y in range(height))
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)),
+        png_chunk(b"IDAT", zlib.compress(rows, PNG_LEVEL)),
+        png_chunk(b"IEND", b""),
+    ))
+
+class FrameCapture:
+    # Copies finished frames into a bounded queue that a writer thread empties to disk, so the
+    # game loop never waits on encoding or I/O
+    # A full queue either drops the new frame ("drop") or holds the game until there is room ("block")
+    # PNG frames go to path/frame_000000.png and so on, numbered by game frame so drops leave gaps
+    # Raw frames are appended to path as packed RGB24, with the size and frame rate in path.json
+    def __init__(self, path, size, fps, format="png", policy="drop", queue_size=CAPTURE_QUEUE):
+        self.path = path
+        self.width, self.height = size
+        self.fps = fps
+        self.format = format
+        self.policy = policy
+        self.queue = queue.Queue(queue_size)
+        self.frame = 0
+        self.written = 0
+        self.dropped = 0
+        self.error = None
+
+        if format == "png":
+            os.makedirs(path, exist_ok=True)
+            self.file = None
+        else:
+            self.file = open(path, "wb")
+        self.thread = threading.Thread(target=self.write_frames, name="frame-writer", daemon=True)
+        self.thread.start()
+
+    def capture(self, surface):
+        # Queue a copy of the surface as the next frame
+        frame = self.frame
+        self.frame += 1
+        if self.policy == "drop" and self.queue.full():
+            self.dropped += 1
+            return
+        data = pygame.image.tobytes(surface, "RGB")
+        if self.policy == "drop":
+            try:
+                self.queue.put_nowait((frame, data))
+            except queue.Full:
+                self.dropped += 1
+        else:
+            self.queue.put((frame, data))
+
+    def write_frames(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                continue  # Keep emptying the queue so a blocked game can still finish
+            frame, data = item
+            try:
+                if self.format == "png":
+                    with open(os.path.join(self.path, f"frame_{frame:06d}.png"), "wb") as f:
+                        f.write(encode_png(data, self.width, self.height))
+                else:
+                    self.file.write(data)
+                self.written += 1
+            except OSError as error:
+                self.error = error
+
+    def close(self):
+        # Write out every queued frame and return (written, dropped)
+        self.queue.put(None)
+        self.thread.join()
+        if self.file is not None:
+            self.file.close()
+            with open(self.path + ".json", "w") as f:
+                json.dump({"width": self.width, "height": self.height, "fps": self.fps,
+                           "pixel_format": "rgb24", "frames": self.written}, f)
+        if self.error is not None:
+            raise self.error
+        return self.written, self.dropped
@@ -0,0 +1,277 @@
+import os
+import math
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # One banner per worker process adds up
+
+import pygame
+
+from hill_climb import WIDTH, HEIGHT, SKY_COLOR, World
+from replay import GAS, BRAKE
+
+# Actions use the replay bits: 0 coast, 1 gas, 2 brake, 3 both
+LOOKAHEAD_POINTS = 32  # Ground heights ahead of the car in every observation
+LOOKAHEAD_SPACING = 25  # Pixels between them
+CAR_FEATURES = 8
+OBSERVATION_SIZE = LOOKAHEAD_POINTS + CAR_FEATURES
+SCORE_REWARD = 0.1  # Reward per point of score, on top of one per meter of new ground
+MAX_EPISODE_STEPS = 3600
+
+# Per-environment arrays every backend steps into, as (name, dtype, shape per environment)
+BUFFERS = [
+    ("observation", np.float32, (OBSERVATION_SIZE,)),
+    ("final_observation", np.float32, (OBSERVATION_SIZE,)),  # Last observation of an episode that just ended
+    ("reward", np.float32, ()),
+    ("terminated", np.bool_, ()),
+    ("truncated", np.bool_, ()),
+    ("distance", np.float64, ()),
+    ("score", np.int64, ()),
+    ("contact", np.bool_, ()),  # Whether the body touched the ground this step
+]
+
+def buffer_size(count):
+    return sum(count * np.dtype(dtype).itemsize * math.prod(shape) for _, dtype, shape in BUFFERS)
+
+def make_buffers(buffer, count, start=0, stop=None):
+    # NumPy views into one flat buffer, optionally of just the environments start:stop
+    stop = count if stop is None else stop
+    views = {}
+    offset = 0
+    for name, dtype, shape in BUFFERS:
+        view = np.ndarray((count,) + shape, dtype=dtype, buffer=buffer, offset=offset)
+        views[name] = view[start:stop]
+        offset += view.nbytes
+    return views
+
+class CarEnv:
+    # One car on its own seeded terrain, stepped a physics step at a time
+    def __init__(self, max_steps=MAX_EPISODE_STEPS):
+        self.max_steps = max_steps
+        self.world = None
+        self.offsets = np.arange(1, LOOKAHEAD_POINTS + 1) * LOOKAHEAD_SPACING
+        self.surface = None
+
+    def reset(self, seed):
+        self.world = World(seed)
+        car = self.world.car
+        self.progress = car.max_distance
+        self.score = car.score
+
+    def step(self, action):
+        # Advance one physics step, returning the reward and whether the episode ended or ran out of time
+        world = self.world
+        car = world.car
+        world.step(bool(action & GAS), bool(action & BRAKE))
+
+        reward = (car.max_distance - self.progress) * 0.1 + (car.score - self.score) * SCORE_REWARD
+        self.progress = car.max_distance
+        self.score = car.score
+        # The world ends the run on empty fuel, a flip or a crash, just as in the game
+        terminated = world.game_over
+        truncated = not terminated and world.steps >= self.max_steps
+        return reward, terminated, truncated
+
+    def observe(self, out):
+        # Fill out with the ground ahead relative to the ground under the car, then the car's state
+        world = self.world
+        car = world.car
+        center_x = car.x + car.width / 2
+        ground = world.terrain.get_height(center_x)
+        out[:LOOKAHEAD_POINTS] = (world.terrain.get_heights(center_x + self.offsets) - ground) / 100
+        out[LOOKAHEAD_POINTS:] = (
+            car.speed / car.max_speed,
+            math.remainder(car.angle, 2 * math.pi),
+            car.angular_velocity,
+            car.fuel / 100,
+            car.back_wheel.suspension_compression / car.back_wheel.suspension_height,
+            car.front_wheel.suspension_compression / car.front_wheel.suspension_height,
+            (ground - car.y - car.height) / 100,  # Clearance under the body
+            world.terrain.get_slope(center_x),
+        )
+
+    def render(self):
+        # The game's view of this car, without the background layers, as a (height, width, 3) array
+        if self.surface is None:
+            self.surface = pygame.Surface((WIDTH, HEIGHT))
+        screen = self.surface
+        world = self.world
+        car = world.car
+        coins = world.coins
+        camera_x = car.x - WIDTH // 3
+        screen.fill(SKY_COLOR)
+        world.terrain.draw(screen, camera_x)
+        for coin in coins.near(camera_x - coins.max_radius, camera_x + WIDTH + coins.max_radius):
+            coin.draw(screen, camera_x)
+        car.draw(screen, camera_x)
+        car.draw_fuel_meter(screen)
+        car.draw_score(screen)
+        return pygame.surfarray.array3d(screen).swapaxes(0, 1)
+
+def random_seed():
+    return int(np.random.SeedSequence().generate_state(1)[0])
+
+class VectorEnv:
+    # Steps count environments at once: step(actions) takes one action per environment and
+    # returns (observations, rewards, terminated, truncated, infos) as arrays
+    # Episodes that end are reset straight away on the next terrain for that environment, and
+    # their last observation is kept in infos["final_observation"]
+    def step(self, actions):
+        self.step_buffers(actions)
+        buffers = self.buffers
+        return (self.observation(), buffers["reward"].copy(), buffers["terminated"].copy(),
+                buffers["truncated"].copy(), self.infos())
+
+    def observation(self):
+        return self.buffers["observation"].copy()
+
+    def infos(self):
+        buffers = self.buffers
+        return {
+            "distance": buffers["distance"].copy(),  # Meters driven this episode, as on the HUD
+            "score": buffers["score"].copy(),
+            "contact": buffers["contact"].copy(),
+            "final_observation": buffers["final_observation"].copy(),
+        }
+
+class BatchEnv(VectorEnv):
+    # Many environments stepped one after another in this process
+    def __init__(self, count, max_steps=MAX_EPISODE_STEPS, buffers=None):
+        self.count = count
+        self.envs = [CarEnv(max_steps) for _ in range(count)]
+        if buffers is None:
+            buffers = make_buffers(bytearray(buffer_size(count)), count)
+        self.buffers = buffers
+        self.seeds = [0] * count
+        self.seed_stride = count  # Added to an environment's seed for its next episode
+
+    def reset(self, seed=None, stride=None):
+        # Environment i starts on seed + i, and each later episode on its seed plus the stride,
+        # so no two environments ever drive the same terrain
+        if seed is None:
+            seed = random_seed()
+        self.seed_stride = stride or self.count
+        buffers = self.buffers
+        for i, env in enumerate(self.envs):
+            self.seeds[i] = seed + i
+            env.reset(self.seeds[i])
+            env.observe(buffers["observation"][i])
+        buffers["reward"][:] = 0
+        buffers["terminated"][:] = False
+        buffers["truncated"][:] = False
+        buffers["distance"][:] = 0
+        buffers["score"][:] = 0
+        buffers["contact"][:] = False
+        return self.observation(), self.infos()
+
+    def step_buffers(self, actions):
+        buffers = self.buffers
+        observation = buffers["observation"]
+        for i, env in enumerate(self.envs):
+            reward, terminated, truncated = env.step(int(actions[i]))
+            buffers["reward"][i] = reward
+            buffers["terminated"][i] = terminated
+            buffers["truncated"][i] = truncated
+            buffers["distance"][i] = env.world.car.distance * 0.1
+            buffers["score"][i] = env.world.car.score
+            buffers["contact"][i] = "contact" in env.world.events
+            env.observe(observation[i])
+            if terminated or truncated:
+                buffers["final_observation"][i] = observation[i]
+                self.seeds[i] += self.seed_stride
+                env.reset(self.seeds[i])
+                env.observe(observation[i])
+
+    def render(self, index=0):
+        return self.envs[index].render()
+
+    def close(self):
+        pass
+
+def worker(connection, name, count, start, stop, max_steps):
+    # Runs environments start:stop of a SubprocessEnv, stepping into its shared memory
+    memory = shared_memory.SharedMemory(name=name)
+    envs = None
+    try:
+        envs = BatchEnv(stop - start, max_steps, make_buffers(memory.buf, count, start, stop))
+        while True:
+            command, argument = connection.recv()
+            if command == "reset":
+                seed, stride = argument
+                envs.reset(seed + start, stride)
+                connection.send(None)
+            elif command == "step":
+                envs.step_buffers(argument)
+                connection.send(None)
+            elif command == "render":
+                connection.send(envs.render(argument))
+            elif command == "close":
+                break
+    finally:
+        envs = None  # Drop the views before closing the memory they point into
+        memory.close()
+
+class SubprocessEnv(VectorEnv):
+    # The same environments split across worker processes, which write observations, rewards and
+    # episode ends straight into shared memory so only the actions cross a pipe
+    def __init__(self, count, workers=None, max_steps=MAX_EPISODE_STEPS):
+        self.count = count
+        workers = min(count, workers or multiprocessing.cpu_count())
+        self.memory = shared_memory.SharedMemory(create=True, size=buffer_size(count))
+        self.buffers = make_buffers(self.memory.buf, count)
+        self.bounds = [(count * i // workers, count * (i + 1) // workers) for i in range(workers)]
+        self.connections = []
+        self.processes = []
+        for start, stop in self.bounds:
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=worker, args=(child, self.memory.name, count, start, stop,
+                                                                   max_steps), daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+    def broadcast(self, command, arguments):
+        for connection, argument in zip(self.connections, arguments):
+            connection.send((command, argument))
+        for connection in self.connections:
+            connection.recv()
+
+    def reset(self, seed=None):
+        if seed is None:
+            seed = random_seed()
+        self.broadcast("reset", [(seed, self.count)] * len(self.connections))
+        return self.observation(), self.infos()
+
+    def step_buffers(self, actions):
+        actions = np.asarray(actions, dtype=np.uint8)
+        self.broadcast("step", [actions[start:stop] for start, stop in self.bounds])
+
+    def render(self, index=0):
+        for connection, (start, stop) in zip(self.connections, self.bounds):
+            if start <= index < stop:
+                connection.send(("render", index - start))
+                return connection.recv()
+        raise IndexError(index)
+
+    def close(self):
+        if self.memory is None:
+            return
+        for connection in self.connections:
+            connection.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.buffers = None
+        self.memory.close()
+        self.memory.unlink()
+        self.memory = None
+
+def make_env(count, backend="batch", **kwargs):
+    # count environments stepped in this process ("batch") or across worker processes ("subprocess")
+    if backend == "batch":
+        return BatchEnv(count, **kwargs)
+    if backend == "subprocess":
+        return SubprocessEnv(count, **kwargs)
+    raise ValueError(f"unknown backend {backend!r}")
@@ -0,0 +1,76 @@
+import sys
+import mmap
+import struct
+from array import array
+
+# File layout: header, then one pose of POSE_SIZE float32s per physics step, starting with the
+# pose before the first step
+MAGIC = b"BRGH"
+VERSION = 1
+HEADER = struct.Struct("<4sHQI2x")  # magic, version, seed, pose count
+POSE_SIZE = 9  # Floats in a pose, laid out as Car.pose
+
+class Ghost:
+    # A recorded run's poses, read a pose at a time straight out of the file
+    def __init__(self, seed, poses, mapping=None):
+        self.seed = seed
+        self.poses = poses  # Flat sequence of floats, a memoryview straight into the file when loaded
+        self.count = len(poses) // POSE_SIZE
+        self.mapping = mapping  # The memory map the poses point into
+
+    def x(self, step):
+        # The body's x after a physics step, holding the last pose once the run is over
+        return self.poses[min(step, self.count - 1) * POSE_SIZE]
+
+    def pose(self, step, alpha):
+        # The pose between the steps before and after step, as lerp_pose would blend them
+        poses = self.poses
+        end = self.count - 1
+        previous = min(max(step - 1, 0), end) * POSE_SIZE
+        current = min(step, end) * POSE_SIZE
+        return tuple(a + (b - a) * alpha for a, b in zip(poses[previous:previous + POSE_SIZE],
+                                                         poses[current:current + POSE_SIZE]))
+
+class GhostField:
+    # Every ghost racing on one terrain, of which only those near the camera are looked at closely
+    def __init__(self, ghosts):
+        self.ghosts = ghosts
+
+    def visible(self, step, alpha, x1, x2):
+        # Poses of the ghosts whose body is between x1 and x2 at this step
+        return [ghost.pose(step, alpha) for ghost in self.ghosts if x1 <= ghost.x(step) <= x2]
+
+    def __len__(self):
+        return len(self.ghosts)
+
+def save_ghost(path, seed, poses):
+    # poses is a flat array("f") of POSE_SIZE floats per pose
+    if sys.byteorder != "little":
+        poses = array("f", poses)
+        poses.byteswap()
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, seed, len(poses) // POSE_SIZE))
+        f.write(poses.tobytes())
+
+def load_ghost(path):
+    # Map the file instead of reading it, so only the poses the race reaches are paged in
+    with open(path, "rb") as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(mapping) < HEADER.size:
+        raise ValueError(f"{path} is not a ghost file")
+    magic, version, seed, count = HEADER.unpack_from(mapping)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a ghost file")
+    if version != VERSION:
+        raise ValueError(f"{path} is ghost version {version}, expected {VERSION}")
+    end = HEADER.size + count * POSE_SIZE * 4
+    if count == 0 or len(mapping) < end:
+        raise ValueError(f"{path} is truncated")
+
+    if sys.byteorder == "little":
+        poses = memoryview(mapping)[HEADER.size:end].cast("f")
+    else:
+        poses = array("f", mapping[HEADER.size:end])
+        poses.byteswap()
+    return Ghost(seed, poses, mapping)
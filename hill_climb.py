@@ -1,16 +1,50 @@
 import pygame
 import sys
 import math
+import time
+import argparse
 import random
 import os
+import operator
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-# Initialize pygame
-pygame.init()
+from capture import CAPTURE_QUEUE, FrameCapture
+from ghost import GhostField, load_ghost, save_ghost
+from telemetry import Telemetry
+from profiler import FrameProfiler
+from quality import QualityGovernor
+from replay import Replay
+from track import load_track, save_track
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; batch queries fall back to plain Python
+    np = None
 
 # Constants
 WIDTH, HEIGHT = 800, 600
 FPS = 60
+PHYSICS_STEP = 1 / 60  # Seconds of game time simulated by one Car.update
+MAX_SUBSTEPS = 5  # Most physics steps run to catch up before a frame is drawn
 GRAVITY = 0.5
+CHUNK_WIDTH = 2000  # Terrain is generated and kept in memory in chunks this wide
+MAX_TERRAIN_CHUNKS = 8  # Chunks kept in memory before the ones behind the car are evicted
+COINS_PER_CHUNK = 4
+MAX_COIN_CHUNKS = 8  # Chunks whose placed coins are kept for resets and restores
+TILE_WIDTH = 250  # Width of the pre-rendered ground tiles
+MAX_TERRAIN_TILES = 12  # Ground tiles cached before the least recently drawn is dropped
+ROTATION_STEP = 2  # Degrees between the pre-rotated sprites in a rotation atlas
+COIN_BUCKET_WIDTH = 200  # Width of the x buckets coins are indexed by
+FLIP_ANGLE = math.radians(100)  # Tilting further than this flips the car and ends the run
+# Corners of the car body around the centre of its sprite, and the middle of its roof where the
+# driver's head is; the run ends if the head goes into the ground
+BODY_HULL = [(-35, -15), (35, -15), (35, 5), (-35, 5)]
+DRIVER_HEAD = (0, -15)
+END_REASONS = [None, "fuel", "flip", "crash"]  # Why a run ended, in snapshot order
+GHOST_ALPHA = 90  # Opacity of the ghost cars, out of 255
+MAX_CACHED_TEXTS = 64  # Rendered strings kept before the least recently used is dropped
 
 # Colors
 GROUND_COLOR = (100, 80, 60)
@@ -19,13 +53,38 @@ CAR_COLOR = (200, 0, 0)
 WHEEL_COLOR = (30, 30, 30)
 FUEL_COLOR = (50, 200, 50)
 FUEL_BG_COLOR = (100, 100, 100)
+HUD_RECT = (15, 15, 240, 90)  # Screen area covered by the fuel meter, score and distance
 COIN_COLOR = (255, 215, 0)
+MOUNTAIN_KEY = (255, 0, 255)  # Colour left out of the mountain strip, which never appears in it
 CLOUD_COLOR = (255, 255, 255)
 
-# Set up the display
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Hill Climb Racing Clone")
-clock = pygame.time.Clock()
+# Fonts are looked up once per size and shared
+fonts = {}
+
+def get_font(size):
+    font = fonts.get(size)
+    if font is None:
+        # Fonts may be needed before main() has initialized pygame, e.g. when rendering headless
+        if not pygame.font.get_init():
+            pygame.font.init()
+        font = pygame.font.SysFont(None, size)
+        fonts[size] = font
+    return font
+
+# Rendered strings, least recently used first, so unchanged text isn't rendered again
+text_cache = OrderedDict()
+
+def render_text(size, text, color):
+    key = (size, text, color)
+    surface = text_cache.get(key)
+    if surface is None:
+        surface = get_font(size).render(text, True, color)
+        text_cache[key] = surface
+        if len(text_cache) > MAX_CACHED_TEXTS:
+            text_cache.popitem(last=False)
+    else:
+        text_cache.move_to_end(key)
+    return surface
 
 # Load or create images
 def create_car_image():
@@ -67,69 +126,211 @@ def create_coin_image(radius):
     # Inner circle
     pygame.draw.circle(coin_img, (255, 235, 0), (radius, radius), radius-2)
     # Dollar sign
-    font = pygame.font.SysFont(None, radius*2)
-    text = font.render("$", True, (255, 255, 255))
+    text = render_text(radius*2, "$", (255, 255, 255))
     text_rect = text.get_rect(center=(radius, radius))
     coin_img.blit(text, text_rect)
     return coin_img
 
+# Every coin of a given size shares one image
+coin_images = {}
+
+def get_coin_image(radius):
+    image = coin_images.get(radius)
+    if image is None:
+        image = create_coin_image(radius)
+        coin_images[radius] = image
+    return image
+
+class RotationAtlas:
+    def __init__(self, image, step=ROTATION_STEP):
+        self.image = image
+        self.step = step
+        # Rotated copies are only made the first time an angle is asked for
+        self.frames = [None] * round(360 / step)
+    
+    def get(self, degrees):
+        # Snap to the nearest step and return the rotated copy of the image
+        index = round(degrees / self.step) % len(self.frames)
+        frame = self.frames[index]
+        if frame is None:
+            frame = pygame.transform.rotate(self.image, index * self.step)
+            self.frames[index] = frame
+        return frame
+
+# Atlases are shared by every car, keyed by sprite name and angle step
+rotation_atlases = {}
+
+def get_rotation_atlas(name, create_image, step=ROTATION_STEP):
+    atlas = rotation_atlases.get((name, step))
+    if atlas is None:
+        atlas = RotationAtlas(create_image(), step)
+        rotation_atlases[(name, step)] = atlas
+    return atlas
+
+def translucent(image, alpha=GHOST_ALPHA):
+    # A copy of a per-pixel alpha image faded to alpha, which survives being rotated
+    image = image.copy()
+    image.fill((255, 255, 255, alpha), special_flags=pygame.BLEND_RGBA_MULT)
+    return image
+
+def draw_ghosts(screen, camera_x, poses, car):
+    # Every ghost is drawn in one batch of blits from the same translucent body and wheel sprites,
+    # sized like the given car
+    body_atlas = get_rotation_atlas("ghost car", lambda: translucent(create_car_image()))
+    radius = car.back_wheel.radius
+    wheel_atlas = get_rotation_atlas(("ghost wheel", radius), lambda: translucent(create_wheel_image(radius)))
+    center_x = car.width / 2 - camera_x
+    center_y = car.height / 2
+    
+    blits = []
+    for x, y, angle, back_x, back_y, back_rotation, front_x, front_y, front_rotation in poses:
+        for wheel_x, wheel_y, rotation in ((back_x, back_y, back_rotation), (front_x, front_y, front_rotation)):
+            image = wheel_atlas.get(math.degrees(rotation))
+            blits.append((image, image.get_rect(center=(wheel_x - camera_x, wheel_y))))
+        image = body_atlas.get(-math.degrees(angle))
+        blits.append((image, image.get_rect(center=(x + center_x, y + center_y))))
+    screen.blits(blits, doreturn=False)
+
 class Cloud:
-    def __init__(self, x, y):
+    def __init__(self, x, y, rng=random):
         self.x = x
         self.y = y
-        self.width = random.randint(60, 120)
-        self.height = random.randint(30, 50)
-        self.speed = random.uniform(0.2, 0.5)
+        self.rng = rng  # Seeded RNG, also used when the cloud wraps
+        self.width = rng.randint(60, 120)
+        self.height = rng.randint(30, 50)
+        self.speed = rng.uniform(0.2, 0.5)
+        self.image = None  # Rendered on first draw
         
-    def update(self):
+    def update(self, camera_x=0):
         self.x += self.speed
-        if self.x > WIDTH + 200:
-            self.x = -self.width - random.randint(0, 100)
-            
+        
+        # Wrap around the parallax view so clouds keep coming however far the camera goes
+        parallax_x = self.x - camera_x * 0.2
+        if parallax_x > WIDTH + 200:
+            self.x = camera_x * 0.2 - self.width - self.rng.randint(0, 100)
+        elif parallax_x < -self.width - 200:
+            self.x = camera_x * 0.2 + WIDTH + self.rng.randint(0, 100)
+    
+    def render(self):
+        # Draw multiple circles for cloud shape
+        radius = self.height // 2
+        image = pygame.Surface((2 * (self.width // 3) + radius * 2, radius * 2 + 10), pygame.SRCALPHA)
+        for i in range(3):
+            x_offset = i * (self.width // 3)
+            pygame.draw.circle(image, CLOUD_COLOR, (radius + x_offset, radius + 10), radius)
+        pygame.draw.circle(image, CLOUD_COLOR, (radius + self.width // 2, radius), radius)
+        return image
+
     def draw(self, screen, camera_x):
         # Apply parallax effect (clouds move slower than terrain)
         parallax_x = self.x - camera_x * 0.2
         
         # Only draw if visible
         if -self.width < parallax_x < WIDTH:
-            # Draw multiple circles for cloud shape
-            for i in range(3):
-                x_offset = i * (self.width // 3)
-                pygame.draw.circle(screen, CLOUD_COLOR, 
-                                  (int(parallax_x + x_offset), int(self.y)), 
-                                  self.height // 2)
-            pygame.draw.circle(screen, CLOUD_COLOR, 
-                              (int(parallax_x + self.width // 2), int(self.y - 10)), 
-                              self.height // 2)
+            if self.image is None:
+                self.image = self.render()
+            radius = self.height // 2
+            screen.blit(self.image, (int(parallax_x) - radius, int(self.y) - radius - 10))
+    
+    def bounds(self, camera_x):
+        # Screen area covered by the cloud sprite
+        radius = self.height // 2
+        parallax_x = self.x - camera_x * 0.2
+        return pygame.Rect(int(parallax_x) - radius, int(self.y) - radius - 10,
+                           2 * (self.width // 3) + radius * 2, radius * 2 + 10)
 
 class Mountain:
-    def __init__(self, x, height):
+    def __init__(self, x, height, rng=random):
         self.x = x
         self.height = height
-        self.width = random.randint(300, 500)
+        self.width = rng.randint(300, 500)
         self.color = (70, 80, 90)
         
-    def draw(self, screen, camera_x):
+    def draw_at(self, screen, x, ground_y):
+        # Draw triangle for mountain
+        points = [
+            (x, ground_y),
+            (x + self.width // 2, ground_y - self.height),
+            (x + self.width, ground_y)
+        ]
+        pygame.draw.polygon(screen, self.color, points)
+        
+        # Draw snow cap
+        snow_points = [
+            (x + self.width // 2 - 20, ground_y - self.height + 20),
+            (x + self.width // 2, ground_y - self.height),
+            (x + self.width // 2 + 20, ground_y - self.height + 20)
+        ]
+        pygame.draw.polygon(screen, (255, 255, 255), snow_points)
+
+class Background:
+    def __init__(self, mountains, clouds, mountain_spacing=300):
+        self.mountains = mountains
+        self.clouds = clouds
+        
+        # The mountain range repeats every period so it never runs out
+        self.period = len(mountains) * mountain_spacing
+        self.sky = self.render_sky()
+        self.full_strip = self.render_mountains()
+        self.low_strip = None  # Half-resolution strip, made the first time low detail is asked for
+        self.mountain_strip = self.full_strip
+        self.low_detail = False
+        self.cloud_mode = "moving"  # "moving", "frozen" or "hidden"
+    
+    def render_sky(self):
+        sky = pygame.Surface((WIDTH, HEIGHT))
+        for y in range(HEIGHT):
+            # Create gradient from sky blue to darker blue
+            color_value = max(80, 235 - y // 2)
+            pygame.draw.line(sky, (135, 206, color_value), (0, y), (WIDTH, y))
+        return sky
+    
+    def render_mountains(self):
+        # Render one period of the range into a strip only as tall as the highest peak
+        # The mountains are solid polygons, so a colour key keeps the sky showing through and
+        # blits far faster than per-pixel alpha
+        strip_height = max(mountain.height for mountain in self.mountains)
+        strip = pygame.Surface((self.period, strip_height))
+        strip.fill(MOUNTAIN_KEY)
+        for mountain in self.mountains:
+            # Mountains hanging over the end of the strip wrap round to its start
+            mountain.draw_at(strip, mountain.x, strip_height)
+            mountain.draw_at(strip, mountain.x - self.period, strip_height)
+        strip.set_colorkey(MOUNTAIN_KEY, pygame.RLEACCEL)
+        return strip
+    
+    def set_low_detail(self, low):
+        # Low detail trades the sky gradient for a flat fill and the mountains for a blocky
+        # half-resolution copy
+        if low and self.low_strip is None:
+            width, height = self.full_strip.get_size()
+            strip = pygame.Surface((width, height))
+            strip.fill(MOUNTAIN_KEY)
+            strip.blit(self.full_strip, (0, 0))
+            strip = pygame.transform.scale(pygame.transform.scale(strip, (width // 2, height // 2)), (width, height))
+            strip.set_colorkey(MOUNTAIN_KEY, pygame.RLEACCEL)
+            self.low_strip = strip
+        self.low_detail = low
+        self.mountain_strip = self.low_strip if low else self.full_strip
+    
+    def draw_sky(self, screen):
+        if self.low_detail:
+            screen.fill(SKY_COLOR)
+        else:
+            screen.blit(self.sky, (0, 0))
+    
+    def draw_mountains(self, screen, camera_x):
         # Apply parallax effect (mountains move slower than terrain)
-        parallax_x = self.x - camera_x * 0.5
-        
-        # Only draw if visible
-        if -self.width < parallax_x < WIDTH:
-            # Draw triangle for mountain
-            points = [
-                (parallax_x, HEIGHT),
-                (parallax_x + self.width // 2, HEIGHT - self.height),
-                (parallax_x + self.width, HEIGHT)
-            ]
-            pygame.draw.polygon(screen, self.color, points)
-            
-            # Draw snow cap
-            snow_points = [
-                (parallax_x + self.width // 2 - 20, HEIGHT - self.height + 20),
-                (parallax_x + self.width // 2, HEIGHT - self.height),
-                (parallax_x + self.width // 2 + 20, HEIGHT - self.height + 20)
-            ]
-            pygame.draw.polygon(screen, (255, 255, 255), snow_points)
+        scroll = int(camera_x * 0.5) % self.period
+        strip_y = HEIGHT - self.mountain_strip.get_height()
+        for x in range(-scroll, WIDTH, self.period):
+            screen.blit(self.mountain_strip, (x, strip_y))
+    
+    def draw_clouds(self, screen, camera_x):
+        if self.cloud_mode == "hidden":
+            return
+        for cloud in self.clouds:
+            cloud.draw(screen, camera_x)
 
 class Coin:
     def __init__(self, x, y):
@@ -137,8 +338,10 @@ class Coin:
         self.y = y
         self.radius = 15
         self.collected = False
-        self.image = create_coin_image(self.radius)
+        self.image = None  # Looked up on first draw
         self.animation_counter = 0
+        self.chunk = None  # Terrain chunk the coin was placed on
+        self.slot = None  # Position among that chunk's coins
         
     def update(self):
         # Simple bobbing animation
@@ -146,12 +349,63 @@ class Coin:
         
     def draw(self, screen, camera_x):
         if not self.collected:
+            if self.image is None:
+                self.image = get_coin_image(self.radius)
+
             # Apply bobbing effect
             bob_offset = math.sin(self.animation_counter) * 3
-            
+
             # Draw coin with animation
             screen.blit(self.image, (self.x - camera_x - self.radius, 
                                     self.y - self.radius + bob_offset))
+    
+    def bounds(self, camera_x):
+        # Screen area the coin can cover anywhere in its bob
+        return pygame.Rect(int(self.x - camera_x - self.radius) - 1, int(self.y - self.radius) - 4,
+                           self.radius * 2 + 2, self.radius * 2 + 8)
+
+class CoinField:
+    def __init__(self, bucket_width=COIN_BUCKET_WIDTH):
+        self.bucket_width = bucket_width
+        # Uncollected coins bucketed by x, so only the buckets near a position are searched
+        self.buckets = {}
+        self.max_radius = 0
+        # Chunk -> bit mask of the slots collected there, so coins dropped from the index and put
+        # back later come back without the ones already taken
+        self.collected = {}
+    
+    def add(self, coins):
+        for coin in coins:
+            self.buckets.setdefault(int(coin.x // self.bucket_width), []).append(coin)
+            self.max_radius = max(self.max_radius, coin.radius)
+    
+    def near(self, x1, x2):
+        # Return the uncollected coins whose x falls between x1 and x2
+        found = []
+        for index in range(int(x1 // self.bucket_width), int(x2 // self.bucket_width) + 1):
+            for coin in self.buckets.get(index, ()):
+                if x1 <= coin.x <= x2:
+                    found.append(coin)
+        return found
+    
+    def collect(self, coin):
+        # Collected coins leave the index so they are never checked or drawn again
+        coin.collected = True
+        if coin.chunk is not None:
+            self.collected[coin.chunk] = self.collected.get(coin.chunk, 0) | 1 << coin.slot
+        index = int(coin.x // self.bucket_width)
+        bucket = self.buckets[index]
+        bucket.remove(coin)
+        if not bucket:
+            del self.buckets[index]
+    
+    def prune(self, x):
+        # Forget the coins left behind x
+        for index in [i for i in self.buckets if (i + 1) * self.bucket_width <= x]:
+            del self.buckets[index]
+    
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets.values())
 
 class Wheel:
     def __init__(self, x_offset, radius=15):
@@ -169,8 +423,8 @@ class Wheel:
         self.suspension_height = 20
         self.suspension_compression = 0
         
-        # Create wheel image
-        self.image = create_wheel_image(radius)
+        # Pre-rotated wheel images shared with every other wheel of this size, looked up on first draw
+        self.atlas = None
 
 class Car:
     def __init__(self):
@@ -184,7 +438,9 @@ class Car:
         self.max_speed = 10
         self.fuel = 100
         self.fuel_consumption = 0.1
+        self.friction = 0.98  # Fraction of the speed kept each step
         self.score = 0
+        self.coins_collected = 0
         self.distance = 0
         self.max_distance = 0
         
@@ -199,8 +455,9 @@ class Car:
         self.angular_velocity = 0
         self.angular_damping = 0.1
         
-        # Create car body image
-        self.image = create_car_image()
+        # Pre-rotated car body images shared with every other car, looked up on first draw
+        self.atlas = None
+        self.simple_springs = False  # Straight lines instead of zigzags, for low quality
         
     def update(self, terrain, gas, brake, coins):
         # Apply gas and brake
@@ -214,14 +471,14 @@ class Car:
         
         # Update speed
         self.speed += self.acceleration
-        self.speed *= 0.98  # Friction
+        self.speed *= self.friction
         
         # Limit speed
         if self.speed > self.max_speed:
             self.speed = self.max_speed
         elif self.speed < -self.max_speed / 2:
             self.speed = -self.max_speed / 2
-            
+
         # Move car forward based on speed and angle
         prev_x = self.x
         self.x += self.speed * math.cos(self.angle)
@@ -256,7 +513,7 @@ class Car:
             angle_diff -= 2 * math.pi
         while angle_diff < -math.pi:
             angle_diff += 2 * math.pi
-            
+
         # Apply angular velocity with spring-like behavior
         self.angular_velocity += angle_diff * 0.1
         self.angular_velocity *= (1 - self.angular_damping)
@@ -272,23 +529,70 @@ class Car:
             self.back_wheel.rotation += rotation_speed
             self.front_wheel.rotation += rotation_speed
         
-        # Check for coin collection
-        for coin in coins:
-            if not coin.collected:
-                # Calculate distance between car center and coin
-                car_center_x = self.x + self.width / 2
-                car_center_y = self.y + self.height / 2
-                distance = math.sqrt((car_center_x - coin.x)**2 + (car_center_y - coin.y)**2)
-                
-                if distance < self.width / 2 + coin.radius:
-                    coin.collected = True
-                    self.score += 10
-                    self.fuel = min(100, self.fuel + 10)  # Bonus fuel
+        # Check for coin collection against the coins within reach of the car
+        car_center_x = self.x + self.width / 2
+        car_center_y = self.y + self.height / 2
+        reach = self.width / 2 + coins.max_radius
+        for coin in coins.near(car_center_x - reach, car_center_x + reach):
+            # Compare squared distance between car center and coin
+            distance_squared = (car_center_x - coin.x)**2 + (car_center_y - coin.y)**2
+
+            if distance_squared < (self.width / 2 + coin.radius)**2:
+                coins.collect(coin)
+                self.score += 10
+                self.coins_collected += 1
+                self.fuel = min(100, self.fuel + 10)  # Bonus fuel
         
         # Check if car is out of fuel
         if self.fuel <= 0:
             self.fuel = 0
     
+    def hull(self, points=BODY_HULL):
+        # Body points in world space, the corners unless others are given
+        center_x = self.x + self.width / 2
+        center_y = self.y + self.height / 2
+        cos = math.cos(self.angle)
+        sin = math.sin(self.angle)
+        return [(center_x + x * cos - y * sin, center_y + x * sin + y * cos) for x, y in points]
+    
+    def ground_events(self, terrain):
+        # Test the body against the ground under it and return what happened this step:
+        # "flip" when tilted past FLIP_ANGLE, "contact" when any part of the body is in the
+        # ground and "crash" when the roof is in it up to the driver's head
+        events = []
+        if abs(math.remainder(self.angle, 2 * math.pi)) > FLIP_ANGLE:
+            events.append("flip")
+        
+        # Broadphase: only the terrain points under the hull's x extent, a handful however long the track
+        hull = self.hull()
+        xs = [x for x, _ in hull]
+        first_x, heights = terrain.points_around(min(xs), max(xs))
+        if max(y for _, y in hull) <= min(heights):
+            return events  # Every corner is above the highest ground anywhere under the car
+        
+        segment_length = terrain.segment_length
+        points = [(first_x + k * segment_length, y) for k, y in enumerate(heights)]
+        ground = [terrain.get_height(x) for x in xs]
+        # Both the hull and the ground are straight lines between their points, so an edge reaches
+        # deepest into the ground at one of its ends or at a terrain point along it
+        for edge in range(len(hull)):
+            (x1, y1), (x2, y2) = hull[edge], hull[(edge + 1) % len(hull)]
+            depth = max(y1 - ground[edge], y2 - ground[(edge + 1) % len(hull)])
+            if x1 > x2:
+                x1, y1, x2, y2 = x2, y2, x1, y1
+            for x, y in points:
+                if x1 < x < x2:
+                    depth = max(depth, y1 + (x - x1) / (x2 - x1) * (y2 - y1) - y)
+            if depth > 0:
+                events.append("contact")
+                break
+        
+        if "contact" in events:
+            (head_x, head_y), = self.hull([DRIVER_HEAD])
+            if head_y > terrain.get_height(head_x):
+                events.append("crash")
+        return events
+    
     def apply_suspension(self, wheel, terrain_height):
         # Save previous position for velocity calculation
         wheel.prev_y = wheel.y
@@ -318,49 +622,85 @@ class Car:
         # Calculate suspension compression for visualization
         wheel.suspension_compression = min(wheel.suspension_height, 
                                           max(0, spring_displacement))
-            
-    def draw(self, screen, camera_x):
+
+    def pose(self):
+        # Everything needed to draw the car, so frames can be drawn between physics steps
+        return (self.x, self.y, self.angle,
+                self.back_wheel.x, self.back_wheel.y, self.back_wheel.rotation,
+                self.front_wheel.x, self.front_wheel.y, self.front_wheel.rotation)
+
+    def draw(self, screen, camera_x, pose=None):
+        if pose is None:
+            pose = self.pose()
+        x, y, angle, back_x, back_y, back_rotation, front_x, front_y, front_rotation = pose
+        
         # Draw suspension springs
-        self.draw_suspension(screen, camera_x, self.back_wheel)
-        self.draw_suspension(screen, camera_x, self.front_wheel)
+        self.draw_suspension(screen, camera_x, x, y, angle, self.back_wheel.x_offset, back_x, back_y)
+        self.draw_suspension(screen, camera_x, x, y, angle, self.front_wheel.x_offset, front_x, front_y)
         
         # Draw wheels with rotation
-        for wheel in [self.back_wheel, self.front_wheel]:
-            # Rotate wheel image
-            rotated_wheel = pygame.transform.rotate(wheel.image, math.degrees(wheel.rotation) % 360)
-            wheel_rect = rotated_wheel.get_rect(center=(wheel.x - camera_x, wheel.y))
+        for wheel, wheel_x, wheel_y, rotation in [(self.back_wheel, back_x, back_y, back_rotation),
+                                                  (self.front_wheel, front_x, front_y, front_rotation)]:
+            if wheel.atlas is None:
+                wheel.atlas = get_rotation_atlas(("wheel", wheel.radius), lambda: create_wheel_image(wheel.radius))
+
+            # Look up the rotated wheel image
+            rotated_wheel = wheel.atlas.get(math.degrees(rotation))
+            wheel_rect = rotated_wheel.get_rect(center=(wheel_x - camera_x, wheel_y))
             screen.blit(rotated_wheel, wheel_rect)
         
         # Draw car body
-        # Create a rotated copy of the car image
-        rotated_car = pygame.transform.rotate(self.image, -math.degrees(self.angle))
-        car_rect = rotated_car.get_rect(center=(self.x + self.width/2 - camera_x, self.y + self.height/2))
+        if self.atlas is None:
+            self.atlas = get_rotation_atlas("car", create_car_image)
+        
+        # Look up the rotated car image
+        rotated_car = self.atlas.get(-math.degrees(angle))
+        car_rect = rotated_car.get_rect(center=(x + self.width/2 - camera_x, y + self.height/2))
         screen.blit(rotated_car, car_rect)
     
-    def draw_suspension(self, screen, camera_x, wheel):
+    def bounds(self, camera_x, pose=None):
+        # Screen area the body, wheels and springs can cover when drawn with this pose
+        if pose is None:
+            pose = self.pose()
+        x, y, angle, back_x, back_y, back_rotation, front_x, front_y, front_rotation = pose
+        
+        # A rotated sprite always fits in a square as wide as its diagonal
+        size = int(math.hypot(self.width, self.height)) + 4
+        rect = pygame.Rect(0, 0, size, size)
+        rect.center = (x + self.width / 2 - camera_x, y + self.height / 2)
+        for wheel, wheel_x, wheel_y in [(self.back_wheel, back_x, back_y), (self.front_wheel, front_x, front_y)]:
+            size = int(wheel.radius * 2 * math.sqrt(2)) + 4
+            wheel_rect = pygame.Rect(0, 0, size, size)
+            wheel_rect.center = (wheel_x - camera_x, wheel_y)
+            rect.union_ip(wheel_rect)
+        return rect
+    
+    def draw_suspension(self, screen, camera_x, car_x, car_y, angle, x_offset, wheel_x, wheel_y):
         # Calculate suspension attachment point on car body
-        body_x = self.x + wheel.x_offset - camera_x
-        body_y = self.y + self.height
+        body_x = car_x + x_offset - camera_x
+        body_y = car_y + self.height
         
         # Rotate attachment point around car center
-        center_x = self.x + self.width / 2 - camera_x
-        center_y = self.y + self.height / 2
+        center_x = car_x + self.width / 2 - camera_x
+        center_y = car_y + self.height / 2
         
         # Translate point to origin
         tx = body_x - center_x
         ty = body_y - center_y
         
         # Rotate point
-        rx = tx * math.cos(self.angle) - ty * math.sin(self.angle)
-        ry = tx * math.sin(self.angle) + ty * math.cos(self.angle)
+        rx = tx * math.cos(angle) - ty * math.sin(angle)
+        ry = tx * math.sin(angle) + ty * math.cos(angle)
         
         # Translate point back
         body_x = rx + center_x
         body_y = ry + center_y
         
         # Draw suspension spring (zigzag line)
-        wheel_x = wheel.x - camera_x
-        wheel_y = wheel.y
+        wheel_x = wheel_x - camera_x
+        if self.simple_springs:
+            pygame.draw.line(screen, (100, 100, 100), (body_x, body_y), (wheel_x, wheel_y), 2)
+            return
         
         # Calculate number of zigzags based on compression
         zigzags = 5
@@ -372,7 +712,7 @@ class Car:
             t = i / (zigzags * 2)
             x = body_x + (wheel_x - body_x) * t
             y = body_y + (wheel_y - body_y) * t
-            
+
             # Add zigzag effect
             if i % 2 == 1:
                 x += zigzag_width
@@ -380,7 +720,7 @@ class Car:
                 x -= zigzag_width
                 
             points.append((x, y))
-            
+
         # Draw the spring
         if len(points) > 1:
             pygame.draw.lines(screen, (100, 100, 100), False, points, 2)
@@ -394,242 +734,1104 @@ class Car:
         pygame.draw.rect(screen, FUEL_COLOR, (20, 20, fuel_width, 20))
         
         # Draw fuel text
-        font = pygame.font.SysFont(None, 24)
-        fuel_text = font.render(f"FUEL: {int(self.fuel)}%", True, (255, 255, 255))
+        fuel_text = render_text(24, f"FUEL: {int(self.fuel)}%", (255, 255, 255))
         screen.blit(fuel_text, (25, 22))
     
     def draw_score(self, screen):
         # Draw score and distance
-        font = pygame.font.SysFont(None, 24)
-        score_text = font.render(f"SCORE: {self.score}", True, (255, 255, 255))
+        score_text = render_text(24, f"SCORE: {self.score}", (255, 255, 255))
         screen.blit(score_text, (20, 50))
         
         # Convert distance to meters (1 pixel = 0.1 meters)
         distance_m = int(self.distance * 0.1)
-        distance_text = font.render(f"DISTANCE: {distance_m}m", True, (255, 255, 255))
+        distance_text = render_text(24, f"DISTANCE: {distance_m}m", (255, 255, 255))
         screen.blit(distance_text, (20, 80))
 
+def surface_arrays(heights, segment_length):
+    # Slope (dy/dx) of every segment between two heights, and its unit normal pointing
+    # up out of the ground, stored as interleaved x, y pairs
+    slopes = array("f")
+    normals = array("f")
+    if np is not None:
+        h = np.frombuffer(heights, dtype=np.float32)
+        slope = np.diff(h) / np.float32(segment_length)
+        normal = np.empty((len(slope), 2), dtype=np.float32)
+        length = np.sqrt(1 + slope * slope)
+        normal[:, 0] = slope / length
+        normal[:, 1] = -1 / length
+        slopes.frombytes(slope.tobytes())
+        normals.frombytes(normal.tobytes())
+        return slopes, normals
+    
+    for i in range(len(heights) - 1):
+        slope = (heights[i + 1] - heights[i]) / segment_length
+        length = math.sqrt(1 + slope * slope)
+        slopes.append(slope)
+        normals.append(slope / length)
+        normals.append(-1 / length)
+    return slopes, normals
+
+class TerrainChunk:
+    def __init__(self, index, x, heights, checkpoints, slopes, normals):
+        self.index = index
+        self.x = x
+        # Float32 heights of evenly spaced points starting at x; the last point is the first
+        # point of the next chunk, so interpolation never crosses chunks
+        self.heights = heights
+        self.slopes = slopes  # Slope of the segment after each point, one fewer than the heights
+        self.normals = normals  # Unit normal of each segment as interleaved x, y
+        self.checkpoints = checkpoints  # x positions of the mountain peaks inside this chunk
+        self.height_array = None  # NumPy view of the heights, made on first batch query
+        self.slope_array = None
+
 class Terrain:
-    def __init__(self, width):
-        self.width = width
-        self.points = []
-        self.checkpoints = []  # Store positions of mountain peaks
-        self.generate_terrain()
+    def __init__(self, width=None, seed=None, track=None, octaves=0):
+        self.width = width  # None streams terrain forever
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.segment_length = 5  # Points are evenly spaced this many pixels apart
+        self.control_spacing = 200  # Distance between the control points the hills are built from
+        self.octaves = octaves  # Layers of extra rolling detail on top of the hills; 0 keeps the classic terrain
+        self.bump_wave = None  # Bump shape between two control points, made on first vectorized chunk
+        self.track = track  # Heights loaded from a track file instead of generated
+        if track is not None:
+            self.width = track.width
+            self.seed = track.seed
+            self.segment_length = track.segment_length
+        self.points_per_chunk = CHUNK_WIDTH // self.segment_length
+        self.chunk_width = self.points_per_chunk * self.segment_length
+        self.max_chunks = MAX_TERRAIN_CHUNKS
+        self.chunks = OrderedDict()  # Index -> chunk, the most recently used last
+        self.active_chunk = 0  # First chunk in view
+        self.recent_chunk = None  # Index of the most recently used chunk, which needs no reordering
+        self.tiles = OrderedDict()  # Rendered ground tiles, least recently drawn first
+        self.grass_spacing = 10  # Points between grass blades, 0 for none
+        
+        # A finite track ends on its last control point, or its last point when loaded from a file
+        if self.width is None:
+            self.end_x = None
+            self.last_chunk = None
+        else:
+            if track is None:
+                self.end_x = self.width // self.control_spacing * self.control_spacing
+            else:
+                self.end_x = self.width
+            self.last_chunk = max(0, (self.end_x - 1) // self.chunk_width)
+        
+        # Track checkpoints sorted into the chunks they fall in
+        self.track_checkpoints = {}
+        if track is not None:
+            for x in track.checkpoints:
+                self.track_checkpoints.setdefault(x // self.chunk_width, []).append(x)
+    
+        # Each detail octave is a sine wave of its own random phase, half the wavelength and
+        # amplitude of the one before, so the detail is a function of x and chunks still line up
+        self.detail_waves = []
+        for octave in range(octaves):
+            rng = random.Random(f"{self.seed}:octave:{octave}")
+            wavelength = self.control_spacing / 2 ** octave
+            self.detail_waves.append((2 * math.pi / wavelength, rng.uniform(0, 2 * math.pi), 8 / 2 ** octave))
+    
+    @classmethod
+    def from_track(cls, path):
+        return cls(track=load_track(path))
+    
+    def save_track(self, path):
+        # Write a finite terrain out as a track file
+        if self.end_x is None:
+            raise ValueError("only terrain with a width can be saved as a track")
+        
+        heights = array("f")
+        checkpoints = []
+        for index in range(self.last_chunk + 1):
+            chunk = self.generate_chunk(index)
+            # Leave out each chunk's closing point, which the next chunk starts with
+            heights.extend(chunk.heights if index == self.last_chunk else chunk.heights[:-1])
+            checkpoints.extend(chunk.checkpoints)
+        save_track(path, heights, checkpoints, self.segment_length, self.seed)
+    
+    def control_height(self, i):
+        # Each control point has its own RNG so any chunk can be rebuilt on its own
+        if i == 0:
+            return HEIGHT // 2
+        rng = random.Random(f"{self.seed}:control:{i}")
+        # Create varied heights but ensure they're not too extreme
+        new_y = HEIGHT // 2 + rng.randint(-100, 100)
+        # Keep terrain within reasonable bounds
+        return max(HEIGHT // 4, min(HEIGHT * 3 // 4, new_y))
+        
+    def generate_chunk(self, index):
+        if self.track is not None:
+            # Slice the chunk straight out of the track, which copies nothing
+            start = index * self.points_per_chunk
+            heights = self.track.heights[start:start + self.points_per_chunk + 1]
+            return TerrainChunk(index, index * self.chunk_width, heights, self.track_checkpoints.get(index, []),
+                                *surface_arrays(heights, self.segment_length))
         
-    def generate_terrain(self):
         # Generate terrain points with smoother transitions
-        x = 0
-        y = HEIGHT // 2
-        
-        # Use Perlin noise-like approach for smoother terrain
-        segment_length = 5  # Smaller segments for smoother curves
-        num_control_points = self.width // 200 + 1
-        control_points = []
-        
-        # Generate control points
-        for i in range(num_control_points):
-            if i == 0:
-                control_points.append((0, HEIGHT // 2))
-            else:
-                # Create varied heights but ensure they're not too extreme
-                new_y = HEIGHT // 2 + random.randint(-100, 100)
-                # Keep terrain within reasonable bounds
-                new_y = max(HEIGHT // 4, min(HEIGHT * 3 // 4, new_y))
-                control_points.append((i * 200, new_y))
-                
-                # Add mountain peaks as checkpoints
-                if i > 1 and control_points[i-1][1] < control_points[i-2][1] and control_points[i-1][1] < new_y:
-                    self.checkpoints.append(control_points[i-1])
+        segment_length = self.segment_length  # Smaller segments for smoother curves
+        controls_per_chunk = self.chunk_width // self.control_spacing
+        first = index * controls_per_chunk
+        last = first + controls_per_chunk
+        if self.end_x is not None:
+            last = min(last, self.end_x // self.control_spacing)
+        
+        # Control heights for this chunk plus one neighbour on each side for peak detection
+        controls = {i: self.control_height(i) for i in range(max(0, first - 1), last + 1)}
+        
+        # Add mountain peaks as checkpoints
+        checkpoints = []
+        for i in range(max(1, first), last):
+            if controls[i] < controls[i - 1] and controls[i] < controls[i + 1]:
+                checkpoints.append(i * self.control_spacing)
+        
+        rng = random.Random(f"{self.seed}:chunk:{index}")
+        if np is not None:
+            heights = self.generate_heights(first, last, controls, rng)
+            return TerrainChunk(index, first * self.control_spacing, heights, checkpoints,
+                                *surface_arrays(heights, segment_length))
         
         # Generate smooth curves between control points using cubic interpolation
-        for i in range(len(control_points) - 1):
-            x1, y1 = control_points[i]
-            x2, y2 = control_points[i + 1]
-            
+        heights = array("f")
+        for i in range(first, last):
+            x1, y1 = i * self.control_spacing, controls[i]
+            x2, y2 = (i + 1) * self.control_spacing, controls[i + 1]
+
             # Add small hills and bumps between control points
             segment_count = (x2 - x1) // segment_length
-            
+
             for j in range(segment_count):
                 t = j / segment_count
                 
                 # Cubic interpolation for smoother curves
                 # Add some small variations for bumps
-                bump = math.sin(t * math.pi * 4) * 5 * random.random()
+                bump = math.sin(t * math.pi * 4) * 5 * rng.random()
                 
                 # Cubic formula: a*t^3 + b*t^2 + c*t + d
                 # Simplified version for our needs
                 y = y1 * (1 - t) + y2 * t + bump
                 
-                self.points.append((x1 + j * segment_length, y))
+                heights.append(y + self.detail(x1 + j * segment_length))
+        
+        # Close the chunk on its last control point, which the next chunk starts from
+        heights.append(controls[last] + self.detail(last * self.control_spacing))
         
+        return TerrainChunk(index, first * self.control_spacing, heights, checkpoints,
+                            *surface_arrays(heights, segment_length))
+    
+    def generate_heights(self, first, last, controls, rng):
+        # The loop in generate_chunk for every point at once, giving the same heights bit for bit
+        segment_count = self.control_spacing // self.segment_length
+        count = (last - first) * segment_count
+        t = np.arange(segment_count) / segment_count
+        if self.bump_wave is None:
+            # math.sin rather than np.sin, which may round differently in the last bit
+            self.bump_wave = np.array([math.sin(v * math.pi * 4) * 5 for v in t])
+        wave = self.bump_wave
+        
+        # random.random() builds each double from two 32-bit outputs of the generator, and
+        # getrandbits hands the same outputs back in order, so the whole chunk is drawn in one call
+        words = np.frombuffer(rng.getrandbits(64 * count).to_bytes(8 * count, "little"), dtype="<u4")
+        randoms = ((words[0::2] >> 5) * 67108864.0 + (words[1::2] >> 6)) * (1.0 / 9007199254740992.0)
+        
+        y1 = np.array([controls[i] for i in range(first, last)])[:, None]
+        y2 = np.array([controls[i + 1] for i in range(first, last)])[:, None]
+        ys = np.empty(count + 1)
+        ys[:-1] = (y1 * (1 - t) + y2 * t + wave * randoms.reshape(-1, segment_count)).ravel()
+        ys[-1] = controls[last]
+        if self.detail_waves:
+            xs = first * self.control_spacing + np.arange(count + 1) * self.segment_length
+            for frequency, phase, amplitude in self.detail_waves:
+                ys += amplitude * np.sin(xs * frequency + phase)
+        
+        heights = array("f")
+        heights.frombytes(ys.astype(np.float32).tobytes())
+        return heights
+    
+    def detail(self, x):
+        # Octave detail added to the height at x
+        return sum(amplitude * math.sin(x * frequency + phase) for frequency, phase, amplitude in self.detail_waves)
+    
+    def get_chunk(self, index):
+        chunk = self.chunks.get(index)
+        if chunk is None:
+            chunk = self.generate_chunk(index)
+            self.chunks[index] = chunk
+            self.evict_chunks()
+        elif index != self.recent_chunk:
+            self.chunks.move_to_end(index)
+        self.recent_chunk = index
+        return chunk
+    
+    def evict_chunks(self):
+        # Drop the least recently used chunks, which while streaming are the ones behind the car
+        while len(self.chunks) > self.max_chunks:
+            self.chunks.popitem(last=False)
+    
+    def stream(self, camera_x):
+        # Generate the chunks around the camera ahead of time and return the last one
+        self.active_chunk = max(0, int(camera_x // self.chunk_width))
+        last = max(0, int((camera_x + WIDTH * 2) // self.chunk_width))
+        if self.last_chunk is not None:
+            self.active_chunk = min(self.active_chunk, self.last_chunk)
+            last = min(last, self.last_chunk)
+        
+        for index in range(self.active_chunk, last + 1):
+            self.get_chunk(index)
+        self.evict_chunks()
+        return last
+    
     def get_height(self, x):
         # Find the height of the terrain at position x
         if x < 0:
-            return self.points[0][1]
-        
-        for i in range(len(self.points) - 1):
-            if self.points[i][0] <= x < self.points[i + 1][0]:
-                # Linear interpolation between points
-                x1, y1 = self.points[i]
-                x2, y2 = self.points[i + 1]
-                
-                if x2 == x1:  # Avoid division by zero
-                    return y1
-                
-                t = (x - x1) / (x2 - x1)
-                return y1 + t * (y2 - y1)
+            x = 0
         
         # If x is beyond the last point
-        return self.points[-1][1]
+        if self.end_x is not None and x >= self.end_x:
+            return self.get_chunk(self.last_chunk).heights[-1]
+        
+        # Points are evenly spaced, so the segment under x is found directly
+        chunk = self.get_chunk(int(x // self.chunk_width))
+        heights = chunk.heights
+        position = (x - chunk.x) / self.segment_length
+        i = min(int(position), len(heights) - 2)
+        
+        # Linear interpolation between points
+        y1 = heights[i]
+        return y1 + (position - i) * (heights[i + 1] - y1)
+    
+    def points_around(self, x1, x2):
+        # Heights of the terrain points from the one at or before x1 to the one at or after x2,
+        # sliced straight out of the chunk arrays, and the x of the first of them
+        segment_length = self.segment_length
+        first = max(0, int(x1 // segment_length))
+        last = max(first, -int(-x2 // segment_length))
+        if self.end_x is not None:
+            # The ground is flat past the last point
+            end = self.end_x // segment_length
+            first = min(first, end)
+            last = min(last, end)
+        
+        # Almost always one chunk holds them all; each chunk also holds the next chunk's first point
+        points_per_chunk = self.points_per_chunk
+        base = first // points_per_chunk * points_per_chunk
+        if last <= base + points_per_chunk:
+            chunk = self.get_chunk(first // points_per_chunk)
+            return first * segment_length, chunk.heights[first - base:last - base + 1]
+        
+        heights = array("f")
+        i = first
+        while i <= last:
+            chunk = self.get_chunk(i // points_per_chunk)
+            base = chunk.index * points_per_chunk
+            stop = min(last, base + points_per_chunk)
+            heights.extend(chunk.heights[i - base:stop - base + 1])
+            i = stop + 1
+        return first * segment_length, heights
+    
+    def get_slope(self, x):
+        # Slope (dy/dx, positive going downhill on screen) of the ground under x
+        if x < 0:
+            x = 0
+        if self.end_x is not None and x >= self.end_x:
+            return 0.0  # Flat past the end of the track
+        
+        chunk = self.get_chunk(int(x // self.chunk_width))
+        return chunk.slopes[min(int((x - chunk.x) / self.segment_length), len(chunk.slopes) - 1)]
+    
+    def get_normal(self, x):
+        # Unit normal of the ground under x, pointing up out of the ground
+        if x < 0:
+            x = 0
+        if self.end_x is not None and x >= self.end_x:
+            return 0.0, -1.0
+        
+        chunk = self.get_chunk(int(x // self.chunk_width))
+        i = min(int((x - chunk.x) / self.segment_length), len(chunk.slopes) - 1)
+        return chunk.normals[2 * i], chunk.normals[2 * i + 1]
+    
+    def get_slopes(self, xs):
+        # Ground slope at many positions in one call
+        if np is None:
+            return [self.get_slope(x) for x in xs]
+        
+        xs = np.maximum(np.asarray(xs, dtype=float), 0)
+        chunk_indices = (xs // self.chunk_width).astype(int)
+        past_end = np.zeros(len(xs), dtype=bool)
+        if self.end_x is not None:
+            past_end = xs >= self.end_x
+            chunk_indices = np.minimum(chunk_indices, self.last_chunk)
+        
+        slopes = np.zeros_like(xs)
+        for index in np.unique(chunk_indices):
+            chunk = self.get_chunk(int(index))
+            if chunk.slope_array is None:
+                chunk.slope_array = np.frombuffer(chunk.slopes, dtype=np.float32)
+
+            mask = chunk_indices == index
+            i = ((xs[mask] - chunk.x) / self.segment_length).astype(int)
+            slopes[mask] = chunk.slope_array[np.minimum(i, len(chunk.slope_array) - 1)]
+        slopes[past_end] = 0.0
+        return slopes
+    
+    def get_heights(self, xs):
+        # Find the terrain height at many positions in one call
+        if np is None:
+            return [self.get_height(x) for x in xs]
+        
+        xs = np.maximum(np.asarray(xs, dtype=float), 0)
+        chunk_indices = (xs // self.chunk_width).astype(int)
+        if self.end_x is not None:
+            xs = np.minimum(xs, self.end_x)
+            chunk_indices = np.minimum(chunk_indices, self.last_chunk)
+        
+        heights = np.empty_like(xs)
+        for index in np.unique(chunk_indices):
+            chunk = self.get_chunk(int(index))
+            if chunk.height_array is None:
+                chunk.height_array = np.frombuffer(chunk.heights, dtype=np.float32)
+
+            # np.interp clamps to the last height past the end of a finite track, like get_height
+            mask = chunk_indices == index
+            heights[mask] = np.interp((xs[mask] - chunk.x) / self.segment_length,
+                                      np.arange(len(chunk.height_array)), chunk.height_array)
+        return heights
+    
+    def render_tile(self, index):
+        # Pre-render the ground and grass under one tile-wide strip of terrain
+        x0 = index * TILE_WIDTH
+        x1 = x0 + TILE_WIDTH
+        if self.end_x is not None:
+            x1 = min(x1, self.end_x)
+        
+        terrain_points = [(x - x0, self.get_height(x)) for x in range(x0, x1 + 1, self.segment_length)]
+        
+        # Crop the tile to the highest grass blade so the sky above isn't stored
+        top = int(min(y for _, y in terrain_points)) - 8
+        tile = pygame.Surface((TILE_WIDTH, HEIGHT - top), pygame.SRCALPHA)
+        terrain_points = [(x, y - top) for x, y in terrain_points]
+        
+        # Add points at the bottom of the tile to fill the terrain
+        polygon = terrain_points + [(terrain_points[-1][0], HEIGHT - top), (terrain_points[0][0], HEIGHT - top)]
+        pygame.draw.polygon(tile, GROUND_COLOR, polygon)
+        
+        # Draw grass on top of terrain, seeded per tile so it looks the same every time
+        rng = random.Random(f"{self.seed}:grass:{index}")
+        for x, y in terrain_points[:-1] if self.grass_spacing else ():
+            if (x0 + x) // self.segment_length % self.grass_spacing == 0:  # Draw grass every few points
+                grass_height = rng.randint(3, 7)
+                pygame.draw.line(tile, (50, 150, 50), (x, y), (x, y - grass_height), 1)
+        
+        return tile, top
+    
+    def set_grass_spacing(self, spacing):
+        # Tiles have their grass baked in, so they are rendered again with the new spacing
+        if spacing != self.grass_spacing:
+            self.grass_spacing = spacing
+            self.tiles.clear()
+    
+    def visible_tiles(self, camera_x):
+        first = max(0, int(camera_x // TILE_WIDTH))
+        last = int((camera_x + WIDTH) // TILE_WIDTH)
+        if self.end_x is not None:
+            last = min(last, (self.end_x - 1) // TILE_WIDTH)
+        return range(first, last + 1)
+    
+    def get_tile(self, index):
+        # The cached tile, rendering it if it hasn't been seen yet
+        cached = self.tiles.get(index)
+        if cached is None:
+            cached = self.render_tile(index)
+            self.tiles[index] = cached
+            if len(self.tiles) > MAX_TERRAIN_TILES:
+                self.tiles.popitem(last=False)
+        else:
+            self.tiles.move_to_end(index)
+        return cached
+    
+    def prerender(self, camera_x):
+        # Render the tiles in view ahead of their first draw
+        for index in self.visible_tiles(camera_x):
+            self.get_tile(index)
     
     def draw(self, screen, camera_x):
-        # Draw terrain
-        terrain_points = []
-        
-        for x, y in self.points:
-            if 0 <= x - camera_x <= WIDTH:
-                terrain_points.append((x - camera_x, y))
-        
-        if terrain_points:
-            # Add points at the bottom of the screen to fill the terrain
-            terrain_points.append((terrain_points[-1][0], HEIGHT))
-            terrain_points.append((terrain_points[0][0], HEIGHT))
-            
-            # Draw terrain with gradient
-            pygame.draw.polygon(screen, GROUND_COLOR, terrain_points)
-            
-            # Draw grass on top of terrain
-            for i in range(len(terrain_points) - 3):
-                x, y = terrain_points[i]
-                if i % 10 == 0:  # Draw grass every few points
-                    grass_height = random.randint(3, 7)
-                    pygame.draw.line(screen, (50, 150, 50), (x, y), (x, y - grass_height), 1)
-
-def generate_coins(terrain, num_coins):
+        # Blit the cached terrain tiles in view
+        # Shift every tile by the same whole pixel amount so neighbours never leave a gap
+        offset = int(camera_x)
+        for index in self.visible_tiles(camera_x):
+            tile, top = self.get_tile(index)
+            screen.blit(tile, (index * TILE_WIDTH - offset, top))
+
+def generate_coins(terrain, chunk_index, num_coins=COINS_PER_CHUNK):
     coins = []
+    chunk = terrain.get_chunk(chunk_index)
+    rng = random.Random(f"{terrain.seed}:coins:{chunk_index}")
     
     # Place coins at interesting locations
-    for checkpoint in terrain.checkpoints:
-        x, y = checkpoint
+    for x in chunk.checkpoints:
+        y = chunk.heights[(x - chunk.x) // terrain.segment_length]
         # Place coin above the peak
         coins.append(Coin(x, y - 50))
     
-    # Add some random coins
-    for _ in range(num_coins - len(terrain.checkpoints)):
-        x = random.randint(500, terrain.width - 500)
-        y = terrain.get_height(x) - random.randint(50, 100)
-        coins.append(Coin(x, y))
+    # Add some random coins, away from the start and the end of the track
+    low = max(500, chunk.x)
+    high = chunk.x + terrain.chunk_width - 1
+    if terrain.end_x is not None:
+        high = min(high, terrain.end_x - 500)
+    if low <= high:
+        for _ in range(num_coins - len(chunk.checkpoints)):
+            x = rng.randint(low, high)
+            y = terrain.get_height(x) - rng.randint(50, 100)
+            coins.append(Coin(x, y))
     
     return coins
 
-def main():
-    # Create game objects
-    terrain = Terrain(10000)  # 10000 pixels wide terrain
-    car = Car()
-    camera_x = 0
+def merge_rects(rects):
+    # Combine overlapping rectangles so each part of the screen is redrawn once
+    merged = []
+    for rect in rects:
+        i = rect.collidelist(merged)
+        while i != -1:
+            rect = rect.union(merged.pop(i))
+            i = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+def lerp_pose(previous, current, alpha):
+    # Blend two car poses, alpha = 0 giving the previous one and 1 the current one
+    return tuple(a + (b - a) * alpha for a, b in zip(previous, current))
+
+# Everything about a car and its wheels that changes as it drives, in snapshot order
+CAR_STATE = ("x", "y", "angle", "speed", "acceleration", "fuel", "score", "distance", "max_distance",
+             "angular_velocity", "coins_collected")
+WHEEL_STATE = ("x", "y", "prev_y", "velocity_y", "rotation", "suspension_compression")
+get_car_state = operator.attrgetter(*CAR_STATE)
+get_wheel_state = operator.attrgetter(*WHEEL_STATE)
+
+class World:
+    def __init__(self, seed=None, width=None, track=None):
+        self.terrain = Terrain(width, seed, track)
+        # The coins of recently reached chunks, the most recently used last, kept so resets and
+        # restores don't place them again; older chunks' coins are placed again from their seed
+        self.coin_cache = OrderedDict()
+        self.reset()
     
-    # Create background elements
-    clouds = [Cloud(random.randint(-200, WIDTH+200), random.randint(50, 150)) for _ in range(5)]
-    mountains = [Mountain(i * 300, random.randint(100, 200)) for i in range(10)]
+    def reset(self):
+        # Start a new run on the same terrain
+        self.car = Car()
+        self.coins = CoinField()
+        self.first_coin_chunk = 0  # Coins of chunks first_coin_chunk up to coin_chunk are in play
+        self.coin_chunk = 0  # Next chunk that needs coins
+        self.steps = 0
+        self.game_over = False
+        self.end_reason = None  # "fuel", "flip" or "crash" once the run is over
+        self.events = []  # Ground events of the latest step
+        self.previous_pose = self.car.pose()
+        self.stream(self.car.x - WIDTH // 3)
     
-    # Create coins
-    coins = generate_coins(terrain, 20)
+    def stream(self, camera_x):
+        # Stream terrain around the camera and keep the coins of the chunks from a screen behind it
+        # to the last streamed chunk in play
+        last_chunk = self.terrain.stream(camera_x)
+        chunk_width = self.terrain.chunk_width
+        first_chunk = min(last_chunk, max(0, int((camera_x - WIDTH) // chunk_width)))
+        
+        # Driving back brings left-behind coins back, less those already collected
+        while self.first_coin_chunk > first_chunk:
+            self.first_coin_chunk -= 1
+            self.coins.add(self.uncollected_coins(self.first_coin_chunk))
+        while self.coin_chunk <= last_chunk:
+            self.coins.add(self.uncollected_coins(self.coin_chunk))
+            self.coin_chunk += 1
+        if self.first_coin_chunk < first_chunk:
+            self.coins.prune(first_chunk * chunk_width)
+            self.first_coin_chunk = first_chunk
     
-    # Game loop
-    running = True
-    game_over = False
+    def uncollected_coins(self, index):
+        collected = self.coins.collected.get(index, 0)
+        return [coin for coin in self.chunk_coins(index) if not collected >> coin.slot & 1]
     
-    while running:
-        # Handle events
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
+    def chunk_coins(self, index):
+        # The coins of a chunk, uncollected, placing them if they aren't cached
+        coins = self.coin_cache.get(index)
+        if coins is None:
+            coins = generate_coins(self.terrain, index)
+            for slot, coin in enumerate(coins):
+                coin.chunk = index
+                coin.slot = slot
+            self.coin_cache[index] = coins
+            if len(self.coin_cache) > MAX_COIN_CHUNKS:
+                self.coin_cache.popitem(last=False)
+        else:
+            self.coin_cache.move_to_end(index)
         
-        # Get keyboard input
-        keys = pygame.key.get_pressed()
-        gas = keys[pygame.K_RIGHT] or keys[pygame.K_UP]
-        brake = keys[pygame.K_LEFT] or keys[pygame.K_DOWN]
+        for coin in coins:
+            coin.collected = False
+            coin.animation_counter = 0
+        return coins
+    
+    def snapshot(self):
+        # The run's whole changing state as a flat array of doubles, small and quick to copy
+        # Terrain, coin positions and every RNG are fixed by the seed, so the coins are saved as
+        # the chunks in play and each chunk's mask of collected slots, and nothing else needs saving
+        car = self.car
+        state = array("d", (self.terrain.seed, self.steps, END_REASONS.index(self.end_reason),
+                            self.first_coin_chunk, self.coin_chunk))
+        state.extend(get_car_state(car))
+        state.extend(get_wheel_state(car.back_wheel))
+        state.extend(get_wheel_state(car.front_wheel))
+        state.extend(self.previous_pose)
+        for chunk, collected in self.coins.collected.items():
+            state.extend((chunk, collected))
+        return state
+    
+    def restore(self, state):
+        # Put the run back exactly as it was when the snapshot was taken, in this world or any
+        # other on the same seed
+        if int(state[0]) != self.terrain.seed:
+            raise ValueError(f"snapshot is of seed {int(state[0])}, not {self.terrain.seed}")
+        self.steps = int(state[1])
+        self.end_reason = END_REASONS[int(state[2])]
+        self.game_over = self.end_reason is not None
+        self.events = []
+        self.first_coin_chunk = int(state[3])
+        self.coin_chunk = int(state[4])
+        car = self.car
+        i = 5
+        for target, names in ((car, CAR_STATE), (car.back_wheel, WHEEL_STATE), (car.front_wheel, WHEEL_STATE)):
+            for name, value in zip(names, state[i:i + len(names)]):
+                setattr(target, name, value)
+            i += len(names)
+        car.score = int(car.score)
+        car.coins_collected = int(car.coins_collected)
+        self.previous_pose = tuple(state[i:i + 9])
+        
+        # Coins collected since go back in play, and coins placed since leave it
+        self.coins.buckets = {}
+        self.coins.collected = {int(chunk): int(collected) for chunk, collected in zip(state[i + 9::2], state[i + 10::2])}
+        for index in range(self.first_coin_chunk, self.coin_chunk):
+            self.coins.add(self.uncollected_coins(index))
+    
+    def step(self, gas, brake, profiler=None, telemetry=None):
+        # Advance the game by one fixed physics step
+        car = self.car
+        self.previous_pose = car.pose()
+        car.update(self.terrain, gas, brake, self.coins)
+        self.steps += 1
+        if profiler is not None:
+            profiler.mark("car.update")
+        
+        # Update the coins in view
+        camera_x = car.x - WIDTH // 3
+        for coin in self.coins.near(camera_x - self.coins.max_radius, camera_x + WIDTH + self.coins.max_radius):
+            coin.update()
+        if profiler is not None:
+            profiler.mark("coins")
+        
+        # The run ends when the car runs out of fuel, flips over or lands on its roof
+        self.events = car.ground_events(self.terrain)
+        if car.fuel <= 0:
+            self.end_reason = "fuel"
+        elif "flip" in self.events:
+            self.end_reason = "flip"
+        elif "crash" in self.events:
+            self.end_reason = "crash"
+        self.game_over = self.end_reason is not None
+        if profiler is not None:
+            profiler.mark("collision")
+        if telemetry is not None:
+            telemetry.record(self, gas, brake)
+            if profiler is not None:
+                profiler.mark("telemetry")
+        
+        # New terrain and its coins, a phase of its own since generating a chunk is the costliest step
+        self.stream(camera_x)
+        if profiler is not None:
+            profiler.mark("stream")
+
+# Quality tiers from best to cheapest, stepped through by the QualityGovernor
+QUALITY_TIERS = [
+    {"name": "high", "grass_spacing": 10, "simple_springs": False, "clouds": "moving", "low_detail": False},
+    {"name": "medium", "grass_spacing": 20, "simple_springs": False, "clouds": "moving", "low_detail": False},
+    {"name": "low", "grass_spacing": 40, "simple_springs": True, "clouds": "frozen", "low_detail": False},
+    {"name": "lower", "grass_spacing": 0, "simple_springs": True, "clouds": "frozen", "low_detail": True},
+    {"name": "minimal", "grass_spacing": 0, "simple_springs": True, "clouds": "hidden", "low_detail": True},
+]
+
+def apply_quality(tier, world, background):
+    settings = QUALITY_TIERS[tier]
+    world.terrain.set_grass_spacing(settings["grass_spacing"])
+    world.car.simple_springs = settings["simple_springs"]
+    background.cloud_mode = settings["clouds"]
+    background.set_low_detail(settings["low_detail"])
+
+class Level:
+    # Everything one run needs: the world plus its background, with the surfaces shown at the
+    # start already rendered. Nothing here touches the display, so it can be built on any thread
+    def __init__(self, seed, track=None, quality=0):
+        self.seed = seed
+        self.quality = quality  # Tier of QUALITY_TIERS the surfaces are rendered at
+        self.world = World(seed, track=track)  # Streams new terrain as the car drives
+        
+        # Create background elements
+        rng = random.Random(seed)
+        self.clouds = [Cloud(rng.randint(-200, WIDTH+200), rng.randint(50, 150), rng) for _ in range(5)]
+        mountains = [Mountain(i * 300, rng.randint(100, 200), rng) for i in range(10)]
+        self.background = Background(mountains, self.clouds)
+        
+        apply_quality(quality, self.world, self.background)
+        for cloud in self.clouds:
+            cloud.image = cloud.render()
+        self.world.terrain.prerender(self.world.car.x - WIDTH // 3)
+
+class LevelLoader:
+    # Builds the levels that may come next on a background thread while the current one is played
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="level-loader")
+        self.pending = {}  # Seed -> (quality tier, future of its level)
+    
+    def prepare(self, seed, track=None, quality=0):
+        # A level already on its way at another tier is built again at this one
+        pending = self.pending.get(seed)
+        if pending is None or pending[0] != quality:
+            self.discard(seed)
+            self.pending[seed] = (quality, self.executor.submit(Level, seed, track, quality))
+    
+    def take(self, seed, track=None, quality=0):
+        # Hand over a prepared level whole, waiting only if it isn't finished yet
+        _, future = self.pending.pop(seed, (None, None))
+        level = Level(seed, track, quality) if future is None else future.result()
+        apply_quality(quality, level.world, level.background)
+        return level
+    
+    def discard(self, seed):
+        # Forget a level that won't be needed, stopping it being built if it hasn't started
+        _, future = self.pending.pop(seed, (None, None))
+        if future is not None:
+            future.cancel()
+    
+    def close(self):
+        for _, future in self.pending.values():
+            future.cancel()
+        self.pending = {}
+        self.executor.shutdown(wait=False)
+
+def simulate(seed, inputs, steps=None, track=None, telemetry=None):
+    # Drive a car over the terrain for the given seed, or over a loaded track, without a display
+    # inputs holds a (gas, brake) pair per step; steps past its end get no input
+    world = World(seed, track=track)
+    if steps is None:
+        steps = len(inputs)
+    if telemetry is not None:
+        telemetry.start_run(seed)
+    
+    for step in range(steps):
+        gas, brake = inputs[step] if step < len(inputs) else (False, False)
+        world.step(gas, brake, telemetry=telemetry)
         
-        # Update game objects if not game over
-        if not game_over:
-            car.update(terrain, gas, brake, coins)
-            
-            # Update clouds
+        # The run is over once the car runs out of fuel, flips or crashes, as in the game
+        if world.game_over:
+            break
+    
+    return world.car
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Bumpy Racer")
+    parser.add_argument("--substeps", type=int, default=MAX_SUBSTEPS,
+                        help="most physics steps run to catch up before a frame is drawn")
+    parser.add_argument("--uncapped", action="store_true",
+                        help="run physics as fast as possible instead of in real time")
+    parser.add_argument("--seed", type=int, help="seed for the terrain, coins and background")
+    parser.add_argument("--record", metavar="PATH",
+                        help="save the inputs of the latest run to PATH when it ends or the game quits")
+    parser.add_argument("--replay", metavar="PATH", help="play back a recorded run")
+    parser.add_argument("--headless", action="store_true",
+                        help="with --replay, re-simulate the run without a display and print the result, "
+                             "or with --capture too, render it without a window")
+    parser.add_argument("--capture", metavar="PATH",
+                        help="save every frame, as PNGs in the directory PATH or as raw RGB24 video in the file PATH")
+    parser.add_argument("--capture-format", choices=["png", "raw"], default="png")
+    parser.add_argument("--capture-policy", choices=["drop", "block"],
+                        help="when the writer falls behind, drop frames or hold the game until it catches up "
+                             "(default: block with --headless, drop otherwise)")
+    parser.add_argument("--capture-queue", type=int, default=CAPTURE_QUEUE, help="frames that may wait to be written")
+    parser.add_argument("--telemetry", metavar="PATH",
+                        help="record the car's state every physics step to PATH, across every run until the game quits")
+    parser.add_argument("--telemetry-format", choices=["bin", "csv"], default="bin")
+    parser.add_argument("--ghost", metavar="PATH", nargs="+", default=[],
+                        help="race against ghost files recorded on the same seed")
+    parser.add_argument("--export-ghost", metavar="PATH",
+                        help="with --replay, save the replayed run's poses as a ghost file and exit")
+    parser.add_argument("--track", metavar="PATH", help="drive a track file instead of generated terrain")
+    parser.add_argument("--export-track", metavar="PATH",
+                        help="save the terrain for --seed as a track file of --track-width pixels and exit")
+    parser.add_argument("--track-width", type=int, default=100000, help="width of an exported track in pixels")
+    parser.add_argument("--quality", choices=["auto"] + [tier["name"] for tier in QUALITY_TIERS], default="auto",
+                        help="fixed level of detail, or auto to lower it whenever frames run over budget")
+    parser.add_argument("--dirty", action="store_true",
+                        help="only redraw and update the parts of the screen that changed")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="write a Chrome trace of recent frames to PATH on quit (F4 writes one at any time)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    
+    # A replay or track brings its own seed; otherwise pick one so the run can still be recorded
+    replay = Replay.load(args.replay) if args.replay else None
+    track = load_track(args.track) if args.track else None
+    if replay is not None:
+        seed = replay.seed
+    elif track is not None:
+        seed = track.seed
+    elif args.seed is not None:
+        seed = args.seed
+    else:
+        seed = random.randrange(2 ** 32)
+    
+    if args.export_track:
+        Terrain(args.track_width, seed).save_track(args.export_track)
+        return
+    
+    if args.export_ghost:
+        if replay is None:
+            print("--export-ghost needs a --replay to record")
+            return
+        # The pose before the first step, then the pose after every step until the run ends
+        world = World(seed, track=track)
+        poses = array("f", world.car.pose())
+        for step in range(len(replay)):
+            world.step(*replay[step])
+            poses.extend(world.car.pose())
+            if world.game_over:
+                break
+        save_ghost(args.export_ghost, seed, poses)
+        print(f"Saved {world.steps} steps of seed {seed} to {args.export_ghost}")
+        return
+    
+    ghosts = [load_ghost(path) for path in args.ghost]
+    
+    if args.headless and replay is None:
+        print("--headless needs a --replay to play")
+        return
+    
+    telemetry = Telemetry(args.telemetry, args.telemetry_format) if args.telemetry else None
+    
+    if replay is not None and args.headless and not args.capture:
+        # Re-simulate the whole run as fast as possible
+        car = simulate(seed, replay, track=track, telemetry=telemetry)
+        print(f"Seed: {seed}  Steps: {len(replay)}  Score: {car.score}  Distance: {int(car.distance * 0.1)}m")
+        if telemetry is not None:
+            print(f"Recorded {telemetry.close()} steps to {args.telemetry}")
+        return
+    
+    if args.headless:
+        # Render the replay without a window, as fast as it can be captured
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+    
+    # Initialize pygame and set up the display
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Hill Climb Racing Clone")
+    clock = pygame.time.Clock()
+    
+    # Captured frames advance the game by exactly one frame each, however long they take to make
+    # Without a window nobody is watching in real time, so waiting on the writer costs nothing
+    capture = None
+    if args.capture:
+        policy = args.capture_policy or ("block" if args.headless else "drop")
+        capture = FrameCapture(args.capture, (WIDTH, HEIGHT), FPS, args.capture_format,
+                               policy, args.capture_queue)
+    
+    # Detail drops whenever frames take too long, unless a fixed level was asked for or the
+    # frames are being captured
+    if args.quality == "auto" and capture is None:
+        governor = QualityGovernor(1 / FPS, len(QUALITY_TIERS))
+        quality = 0
+    else:
+        governor = None
+        quality = [tier["name"] for tier in QUALITY_TIERS].index(args.quality if args.quality != "auto" else "high")
+    
+    # Create game objects, with everything shown at the start rendered at the chosen detail
+    level = Level(seed, track, quality)
+    world, clouds, background = level.world, level.clouds, level.background
+    recording = Replay(seed) if args.record else None
+    
+    # Restarting and, outside replays and track files, moving on to a new track both pick up a
+    # level built in the background, ready before the player asks for it
+    loader = LevelLoader()
+    new_tracks = replay is None and track is None
+    next_seed = random.randrange(2 ** 32) if new_tracks else None
+    loader.prepare(seed, track, quality)
+    if new_tracks:
+        loader.prepare(next_seed, quality=quality)
+    
+    # Always-on phase timings; F3 shows the overlay and F4 writes a trace
+    profiler = FrameProfiler()
+    
+    profiler.status["quality"] = QUALITY_TIERS[quality]["name"]
+    
+    if telemetry is not None:
+        telemetry.start_run(seed)
+    
+    # Ghosts only race on the seed they were recorded on
+    ghost_field = GhostField([ghost for ghost in ghosts if ghost.seed == seed])
+    ghost_poses = []
+    if len(ghost_field) < len(ghosts):
+        print(f"{len(ghosts) - len(ghost_field)} ghosts were recorded on other seeds and won't race")
+    
+    def step_physics(gas, brake):
+        # Inputs come from the replay being played back, if there is one
+        if replay is not None:
+            if world.steps >= len(replay):
+                # The recorded run is over
+                world.game_over = True
+                return
+            gas, brake = replay[world.steps]
+        
+        camera_x = world.car.x - WIDTH // 3
+        world.step(gas, brake, profiler, telemetry)
+        if background.cloud_mode == "moving":
             for cloud in clouds:
-                cloud.update()
-                
-            # Update coins
-            for coin in coins:
-                coin.update()
-            
-            # Check if game is over
-            if car.fuel <= 0:
-                game_over = True
-        
-        # Update camera to follow car
-        camera_x = car.x - WIDTH // 3
+                cloud.update(camera_x)
+        profiler.mark("clouds")
+        
+        if recording is not None:
+            recording.record(gas, brake)
+            if world.game_over:
+                recording.save(args.record)
+    
+    game_over_overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+    game_over_overlay.fill((0, 0, 0, 128))
+    
+    def draw_scene(camera_x, pose, ghost_poses):
+        car = world.car
+        coins = world.coins
         
         # Draw everything
-        # Sky gradient
-        for y in range(HEIGHT):
-            # Create gradient from sky blue to darker blue
-            color_value = max(80, 235 - y // 2)
-            pygame.draw.line(screen, (135, 206, color_value), (0, y), (WIDTH, y))
-        
-        # Draw mountains in background
-        for mountain in mountains:
-            mountain.draw(screen, camera_x)
-            
-        # Draw clouds
-        for cloud in clouds:
-            cloud.draw(screen, camera_x)
+        # Sky, mountains and clouds
+        background.draw_sky(screen)
+        profiler.mark("draw sky")
+        background.draw_mountains(screen, camera_x)
+        profiler.mark("draw mountains")
+        background.draw_clouds(screen, camera_x)
+        profiler.mark("draw clouds")
         
         # Draw terrain
-        terrain.draw(screen, camera_x)
+        world.terrain.draw(screen, camera_x)
+        profiler.mark("draw terrain")
         
-        # Draw coins
-        for coin in coins:
+        # Draw the coins in view
+        for coin in coins.near(camera_x - coins.max_radius, camera_x + WIDTH + coins.max_radius):
             coin.draw(screen, camera_x)
+        profiler.mark("draw coins")
+        
+        # Ghosts, behind the car
+        if ghost_poses:
+            draw_ghosts(screen, camera_x, ghost_poses, car)
+            profiler.mark("draw ghosts")
         
         # Draw car
-        car.draw(screen, camera_x)
+        car.draw(screen, camera_x, pose)
+        profiler.mark("draw car")
         
         # Draw UI elements
         car.draw_fuel_meter(screen)
         car.draw_score(screen)
+        profiler.mark("draw hud")
         
-        # Display game over if out of fuel
-        if game_over:
+        # Display game over, and why, once the run has ended
+        if world.game_over:
             # Semi-transparent overlay
-            overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 128))
-            screen.blit(overlay, (0, 0))
-            
-            font = pygame.font.SysFont(None, 72)
-            game_over_text = font.render("GAME OVER", True, (255, 0, 0))
+            screen.blit(game_over_overlay, (0, 0))
+
+            game_over_text = render_text(72, "GAME OVER", (255, 0, 0))
             screen.blit(game_over_text, (WIDTH // 2 - game_over_text.get_width() // 2, HEIGHT // 3))
-            
-            font = pygame.font.SysFont(None, 48)
-            score_text = font.render(f"Final Score: {car.score}", True, (255, 255, 255))
+
+            reason = {"fuel": "Out of fuel", "flip": "Flipped over", "crash": "Crashed"}.get(world.end_reason)
+            if reason is not None:
+                reason_text = render_text(36, reason, (255, 255, 255))
+                screen.blit(reason_text, (WIDTH // 2 - reason_text.get_width() // 2, HEIGHT // 3 + 55))
+
+            score_text = render_text(48, f"Final Score: {car.score}", (255, 255, 255))
             screen.blit(score_text, (WIDTH // 2 - score_text.get_width() // 2, HEIGHT // 2))
-            
+
             distance_m = int(car.distance * 0.1)
-            distance_text = font.render(f"Distance: {distance_m}m", True, (255, 255, 255))
+            distance_text = render_text(48, f"Distance: {distance_m}m", (255, 255, 255))
             screen.blit(distance_text, (WIDTH // 2 - distance_text.get_width() // 2, HEIGHT // 2 + 50))
-            
-            font = pygame.font.SysFont(None, 36)
-            restart_text = font.render("Press R to restart", True, (255, 255, 255))
+
+            restart_text = render_text(36, "Press R to restart, N for a new track" if new_tracks
+                                       else "Press R to restart", (255, 255, 255))
             screen.blit(restart_text, (WIDTH // 2 - restart_text.get_width() // 2, HEIGHT // 2 + 100))
-            
-            if keys[pygame.K_r]:
-                # Reset game
-                car = Car()
-                coins = generate_coins(terrain, 20)
-                game_over = False
-        
-        # Update display
-        pygame.display.flip()
-        clock.tick(FPS)
+            profiler.mark("draw game over")
+        
+        if profiler.visible:
+            profiler.draw_overlay(screen, render_text)
+            profiler.mark("draw profiler")
+    
+    def dynamic_rects(camera_x, pose, ghost_poses):
+        # Screen areas of everything that can change while the camera stands still
+        coins = world.coins
+        rects = [world.car.bounds(camera_x, pose), pygame.Rect(HUD_RECT)]
+        rects.extend(world.car.bounds(camera_x, ghost_pose) for ghost_pose in ghost_poses)
+        rects.extend(coin.bounds(camera_x) for coin in
+                     coins.near(camera_x - coins.max_radius, camera_x + WIDTH + coins.max_radius))
+        rects.extend(cloud.bounds(camera_x) for cloud in clouds)
+        if profiler.visible:
+            rects.append(profiler.overlay_rect)
+        return [rect.clip(screen_rect) for rect in rects if rect.colliderect(screen_rect)]
+    
+    # Dirty-rectangle mode remembers what was drawn last frame
+    screen_rect = screen.get_rect()
+    previous_rects = []
+    previous_state = None
+    previous_camera_x = 0
+    
+    # Physics runs in fixed steps; the time not yet simulated carries over to the next frame
+    accumulator = 0.0
+    previous_time = time.perf_counter()
+    
+    # Game loop
+    running = True
+    
+    while running:
+        profiler.begin_frame()
+        
+        # Handle events
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.WINDOWEXPOSED:
+                previous_state = None  # The whole window needs drawing again
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.visible = not profiler.visible
+                previous_state = None
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                profiler.export_trace(args.trace or "trace.json")
+        
+        # Get keyboard input
+        keys = pygame.key.get_pressed()
+        gas = keys[pygame.K_RIGHT] or keys[pygame.K_UP]
+        brake = keys[pygame.K_LEFT] or keys[pygame.K_DOWN]
+        profiler.mark("events")
+        
+        now = time.perf_counter()
+        frame_time = now - previous_time if capture is None else 1 / FPS
+        previous_time = now
+        
+        # Update game objects if not game over
+        if args.uncapped:
+            # Spend one frame's worth of real time on physics, then draw the latest state
+            steps = 0
+            while not world.game_over and (steps == 0 or time.perf_counter() - now < 1 / FPS):
+                step_physics(gas, brake)
+                steps += 1
+            alpha = 1.0
+        else:
+            accumulator += frame_time
+            steps = 0
+            while accumulator >= PHYSICS_STEP and steps < args.substeps:
+                if not world.game_over:
+                    step_physics(gas, brake)
+                accumulator -= PHYSICS_STEP
+                steps += 1
+
+            # Drop any backlog left after the most substeps rather than falling further behind
+            accumulator = min(accumulator, PHYSICS_STEP)
+            # Once the run is over the car stays where its last step left it
+            alpha = 1.0 if world.game_over else accumulator / PHYSICS_STEP
+        
+        if world.game_over and (keys[pygame.K_r] or (new_tracks and keys[pygame.K_n])):
+            # Swap in the prepared level and start preparing the ones after it
+            # Only the restart and the next track are ever kept prepared
+            if not keys[pygame.K_r]:
+                loader.discard(seed)
+                seed, next_seed = next_seed, random.randrange(2 ** 32)
+                loader.prepare(next_seed, quality=quality)
+            level = loader.take(seed, track, quality)
+            world, clouds, background = level.world, level.clouds, level.background
+            loader.prepare(seed, track, quality)
+            accumulator = 0.0
+            previous_state = None
+            if recording is not None:
+                recording = Replay(seed)
+            if telemetry is not None:
+                telemetry.start_run(seed)
+            ghost_field = GhostField([ghost for ghost in ghosts if ghost.seed == seed])
+            profiler.mark("restart")  # Includes any wait for a level the loader hasn't finished
+        
+        # Draw the car between its last two physics states, and follow it with the camera
+        pose = lerp_pose(world.previous_pose, world.car.pose(), alpha)
+        camera_x = pose[0] - WIDTH // 3
+        
+        # Only the ghosts near the screen have their poses read, once per frame
+        margin = world.car.width * 2
+        ghost_poses = ghost_field.visible(world.steps, alpha, camera_x - margin, camera_x + WIDTH + margin)
+        profiler.mark("ghosts")
+        
+        if not args.dirty:
+            draw_scene(camera_x, pose, ghost_poses)
+            pygame.display.flip()
+        else:
+            # Nothing is drawn at all while the scene stands still, e.g. on the game over screen
+            state = (pose, world.steps, world.game_over, profiler.visible and id(profiler.overlay_lines))
+            if state != previous_state:
+                rects = dynamic_rects(camera_x, pose, ghost_poses)
+                if (previous_state is None or int(camera_x) != int(previous_camera_x)
+                        or world.game_over != previous_state[2]):
+                    # Every layer scrolls at its own rate, so a camera move redraws the whole frame
+                    draw_scene(camera_x, pose, ghost_poses)
+                    pygame.display.flip()
+                else:
+                    # Redraw what was under last frame's moving parts and what is under them now
+                    dirty = merge_rects(previous_rects + rects)
+                    for rect in dirty:
+                        screen.set_clip(rect)
+                        draw_scene(camera_x, pose, ghost_poses)
+                    screen.set_clip(None)
+                    pygame.display.update(dirty)
+                previous_rects = rects
+                previous_state = state
+                previous_camera_x = camera_x
+        profiler.mark("flip")
+        
+        # Uncapped frames fill their time with physics on purpose, so only capped frames are governed
+        if governor is not None and not args.uncapped and governor.update(time.perf_counter() - profiler.frame_start):
+            quality = governor.tier
+            apply_quality(quality, world, background)
+            profiler.status["quality"] = QUALITY_TIERS[quality]["name"]
+            # Prepare the upcoming levels again so they are ready at the new detail
+            loader.prepare(seed, track, quality)
+            if new_tracks:
+                loader.prepare(next_seed, quality=quality)
+            previous_state = None
+        if governor is not None:
+            profiler.mark("quality")
+        
+        if capture is not None:
+            # The screen holds the finished frame whether it was flipped or only partly updated
+            capture.capture(screen)
+            profiler.mark("capture")
+            if args.headless and world.game_over:
+                running = False  # The replay has been captured to its end
+        
+        clock.tick(0 if args.uncapped or args.headless else FPS)
+        profiler.mark("tick")
+        profiler.end_frame()
+    
+    # Keep the run in progress if the game is closed mid-run
+    if recording is not None and not world.game_over:
+        recording.save(args.record)
+    loader.close()
+    
+    if capture is not None:
+        written, dropped = capture.close()
+        print(f"Captured {written} frames to {args.capture}" + (f", dropped {dropped}" if dropped else ""))
+    
+    if telemetry is not None:
+        print(f"Recorded {telemetry.close()} steps to {args.telemetry}")
+    
+    if args.trace:
+        profiler.export_trace(args.trace)
     
     pygame.quit()
     sys.exit()
@@ -0,0 +1,150 @@
+import json
+import time
+from array import array
+
+import pygame
+
+PROFILE_FRAMES = 600  # Frames of history kept for the overlay's statistics
+PROFILE_EVENTS = 16384  # Phase timings kept for the trace export
+OVERLAY_REFRESH = 15  # Frames between overlay text updates
+
+class FrameProfiler:
+    def __init__(self, frames=PROFILE_FRAMES, events=PROFILE_EVENTS):
+        # Everything is stored in preallocated ring buffers so profiling is cheap enough to leave on
+        self.frame_capacity = frames
+        self.event_capacity = events
+        self.phase_ids = {}
+        self.phase_names = []
+        self.phase_times = []  # One ring of per-frame totals per phase
+        self.current = array("d")  # Per-phase totals for the frame in progress
+
+        self.frame_times = array("d", bytes(8 * frames))
+        self.frame_starts = array("d", bytes(8 * frames))
+        self.frame_index = 0
+        self.frame_count = 0
+
+        self.event_phase = array("H", bytes(2 * events))
+        self.event_start = array("d", bytes(8 * events))
+        self.event_duration = array("d", bytes(8 * events))
+        self.event_index = 0
+        self.event_count = 0
+
+        self.frame_start = time.perf_counter()
+        self.last_mark = self.frame_start
+        self.visible = False
+        self.overlay_lines = []
+        self.status = {}  # Extra labelled lines shown under the timings
+        self.overlay_background = None
+        self.overlay_rect = pygame.Rect(0, 0, 0, 0)  # Where the overlay was last drawn
+
+    def begin_frame(self):
+        self.frame_start = self.last_mark = time.perf_counter()
+
+    def mark(self, name):
+        # Close the phase that started at the previous mark
+        now = time.perf_counter()
+        phase = self.phase_ids.get(name)
+        if phase is None:
+            phase = self.add_phase(name)
+
+        duration = now - self.last_mark
+        self.current[phase] += duration
+
+        i = self.event_index
+        self.event_phase[i] = phase
+        self.event_start[i] = self.last_mark
+        self.event_duration[i] = duration
+        self.event_index = (i + 1) % self.event_capacity
+        self.event_count = min(self.event_count + 1, self.event_capacity)
+
+        self.last_mark = now
+
+    def add_phase(self, name):
+        phase = len(self.phase_names)
+        self.phase_ids[name] = phase
+        self.phase_names.append(name)
+        self.phase_times.append(array("d", bytes(8 * self.frame_capacity)))
+        self.current.append(0.0)
+        return phase
+
+    def end_frame(self):
+        i = self.frame_index
+        self.frame_times[i] = time.perf_counter() - self.frame_start
+        self.frame_starts[i] = self.frame_start
+        for phase, times in enumerate(self.phase_times):
+            times[i] = self.current[phase]
+            self.current[phase] = 0.0
+
+        self.frame_index = (i + 1) % self.frame_capacity
+        self.frame_count = min(self.frame_count + 1, self.frame_capacity)
+
+        if self.visible and self.frame_count and self.frame_index % OVERLAY_REFRESH == 0:
+            self.overlay_lines = self.summary()
+
+    def percentiles(self, percents=(50, 95, 99)):
+        # Frame time percentiles in milliseconds over the recorded frames
+        times = sorted(self.frame_times[:self.frame_count])
+        if not times:
+            return [0.0 for _ in percents]
+        return [times[min(len(times) - 1, len(times) * p // 100)] * 1000 for p in percents]
+
+    def phase_averages(self):
+        # Average milliseconds per frame spent in each phase, slowest first
+        count = self.frame_count or 1
+        averages = [(name, sum(times[:self.frame_count]) / count * 1000)
+                    for name, times in zip(self.phase_names, self.phase_times)]
+        return sorted(averages, key=lambda item: -item[1])
+
+    def summary(self):
+        p50, p95, p99 = self.percentiles()
+        lines = [f"frame p50 {p50:.2f}  p95 {p95:.2f}  p99 {p99:.2f} ms"]
+        lines.extend(f"{name:>12} {average:6.2f} ms" for name, average in self.phase_averages())
+        lines.extend(f"{label:>12} {text}" for label, text in self.status.items())
+        return lines
+
+    def draw_overlay(self, screen, render_text):
+        if not self.overlay_lines:
+            self.overlay_lines = self.summary()
+
+        width = 260
+        height = 18 * len(self.overlay_lines) + 10
+        x = screen.get_width() - width - 10
+        if self.overlay_background is None or self.overlay_background.get_height() != height:
+            self.overlay_background = pygame.Surface((width, height), pygame.SRCALPHA)
+            self.overlay_background.fill((0, 0, 0, 160))
+        self.overlay_rect = screen.blit(self.overlay_background, (x, 10))
+        for i, line in enumerate(self.overlay_lines):
+            screen.blit(render_text(20, line, (255, 255, 255)), (x + 8, 15 + 18 * i))
+
+    def export_trace(self, path):
+        # Write the recorded phases as Chrome trace-event JSON (chrome://tracing, Perfetto)
+        events = []
+        first = (self.event_index - self.event_count) % self.event_capacity
+        for n in range(self.event_count):
+            i = (first + n) % self.event_capacity
+            events.append({
+                "name": self.phase_names[self.event_phase[i]],
+                "ph": "X",
+                "ts": self.event_start[i] * 1e6,
+                "dur": self.event_duration[i] * 1e6,
+                "pid": 1,
+                "tid": 1,
+            })
+
+        # Frames that overlap the recorded phases, so each phase nests under its frame
+        since = events[0]["ts"] if events else 0
+        first = (self.frame_index - self.frame_count) % self.frame_capacity
+        for n in range(self.frame_count):
+            i = (first + n) % self.frame_capacity
+            if self.frame_starts[i] * 1e6 >= since:
+                events.append({
+                    "name": "frame",
+                    "ph": "X",
+                    "ts": self.frame_starts[i] * 1e6,
+                    "dur": self.frame_times[i] * 1e6,
+                    "pid": 1,
+                    "tid": 1,
+                })
+
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
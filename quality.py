@@ -0,0 +1,49 @@
+from array import array
+
+GOVERNOR_WINDOW = 30  # Frames averaged before each decision
+DOWNGRADE_AT = 0.9  # Average share of the frame budget that drops a tier
+UPGRADE_AT = 0.6  # Share of the budget every window must stay under to climb back a tier
+UPGRADE_WINDOWS = 4  # Calm windows in a row needed to climb back
+MAX_UPGRADE_WINDOWS = 64
+
+class QualityGovernor:
+    # Steps through quality tiers, 0 being the best, to keep frames within their time budget
+    # The gap between the two thresholds and the wait before climbing back stop it flipping
+    # between tiers, and every climb that has to be undone makes the next climb wait twice as long
+    def __init__(self, budget, tiers, window=GOVERNOR_WINDOW):
+        self.budget = budget  # Seconds of work a frame may take
+        self.tiers = tiers
+        self.tier = 0
+        self.costs = array("d", bytes(8 * window))
+        self.count = 0
+        self.calm_windows = 0
+        self.upgrade_windows = UPGRADE_WINDOWS
+        self.last_change = None
+
+    def update(self, cost):
+        # Record the seconds one frame's work took; returns True when the tier changes
+        self.costs[self.count] = cost
+        self.count += 1
+        if self.count < len(self.costs):
+            return False
+        self.count = 0
+
+        average = sum(self.costs) / len(self.costs)
+        if average > self.budget * DOWNGRADE_AT:
+            self.calm_windows = 0
+            if self.tier < self.tiers - 1:
+                if self.last_change == "up":
+                    self.upgrade_windows = min(self.upgrade_windows * 2, MAX_UPGRADE_WINDOWS)
+                self.tier += 1
+                self.last_change = "down"
+                return True
+        elif average < self.budget * UPGRADE_AT:
+            self.calm_windows += 1
+            if self.calm_windows >= self.upgrade_windows and self.tier > 0:
+                self.calm_windows = 0
+                self.tier -= 1
+                self.last_change = "up"
+                return True
+        else:
+            self.calm_windows = 0
+        return False
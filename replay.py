@@ -0,0 +1,56 @@
+import struct
+
+# File layout: header, then 2 bits of input per physics step, 4 steps to a byte
+MAGIC = b"BRRP"
+VERSION = 1
+HEADER = struct.Struct("<4sHQI")  # magic, version, seed, step count
+
+GAS = 1
+BRAKE = 2
+
+class Replay:
+    def __init__(self, seed, data=None, count=0):
+        self.seed = seed
+        self.data = bytearray(data or b"")
+        self.count = count
+
+    def record(self, gas, brake):
+        # Append one physics step of input
+        if self.count % 4 == 0:
+            self.data.append(0)
+        bits = (GAS if gas else 0) | (BRAKE if brake else 0)
+        self.data[-1] |= bits << (self.count % 4 * 2)
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, step):
+        # The (gas, brake) input for one physics step
+        if not 0 <= step < self.count:
+            raise IndexError(step)
+        bits = self.data[step >> 2] >> (step % 4 * 2)
+        return bool(bits & GAS), bool(bits & BRAKE)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.seed, self.count))
+            f.write(self.data)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+            data = f.read()
+
+        if len(header) < HEADER.size:
+            raise ValueError(f"{path} is not a replay file")
+        magic, version, seed, count = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a replay file")
+        if version != VERSION:
+            raise ValueError(f"{path} is replay version {version}, expected {VERSION}")
+        if len(data) < (count + 3) // 4:
+            raise ValueError(f"{path} is truncated")
+
+        return cls(seed, data[:(count + 3) // 4], count)
@@ -0,0 +1,197 @@
+import sys
+import queue
+import struct
+import operator
+import threading
+from array import array
+
+from replay import GAS, BRAKE
+
+# File layout: header, one (name, typecode) entry per column, then chunks of rows, each a chunk
+# header followed by every column's values for those rows, little-endian
+MAGIC = b"BRTL"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")  # magic, version, column count
+COLUMN = struct.Struct("<23sc")  # name, array typecode
+CHUNK = struct.Struct("<QI")  # seed, row count
+
+TELEMETRY_CHUNK = 1024  # Rows handed to the writer at a time
+TELEMETRY_CHUNKS = 8  # Chunks in the ring; recording only waits if the writer is this far behind
+
+# One row per physics step
+COLUMNS = [
+    ("step", "I"),
+    ("input", "B"),  # Replay bits: 1 gas, 2 brake
+    ("x", "d"),
+    ("y", "f"),
+    ("angle", "f"),
+    ("angular_velocity", "f"),
+    ("speed", "f"),
+    ("fuel", "f"),
+    ("back_y", "f"),
+    ("back_velocity_y", "f"),
+    ("back_compression", "f"),
+    ("front_y", "f"),
+    ("front_velocity_y", "f"),
+    ("front_compression", "f"),
+    ("coins", "H"),  # Coins collected so far this run
+    ("events", "B"),  # Ground events, as EVENT_BITS
+]
+EVENT_BITS = {"contact": 1, "crash": 2, "flip": 4}
+CSV_FORMATS = {"d": "{:.3f}", "f": "{:.6g}"}
+
+get_wheel_row = operator.attrgetter("y", "velocity_y", "suspension_compression")
+
+class Telemetry:
+    # Records the car's state every physics step into preallocated columns that form a ring of
+    # chunks, and a writer thread saves each chunk as it fills, so recording never allocates
+    # storage or waits on I/O
+    # Rows are saved as the binary layout above ("bin") or as CSV with a seed column first ("csv")
+    def __init__(self, path, format="bin", chunk_rows=TELEMETRY_CHUNK, chunks=TELEMETRY_CHUNKS):
+        self.path = path
+        self.format = format
+        self.chunk_rows = chunk_rows
+        self.chunks = chunks
+        self.columns = [array(typecode, bytes(array(typecode).itemsize * chunk_rows * chunks))
+                        for _, typecode in COLUMNS]
+        self.queue = queue.Queue()
+        self.free = threading.Semaphore(chunks)  # Chunks the recorder may fill
+        self.seed = 0
+        self.written = 0
+        self.error = None
+
+        self.file = open(path, "w" if format == "csv" else "wb")
+        if format == "csv":
+            self.file.write(",".join(["seed"] + [name for name, _ in COLUMNS]) + "\n")
+        else:
+            self.file.write(HEADER.pack(MAGIC, VERSION, len(COLUMNS)))
+            for name, typecode in COLUMNS:
+                self.file.write(COLUMN.pack(name.encode(), typecode.encode()))
+
+        self.free.acquire()
+        self.start = 0
+        self.row = 0
+        self.end = chunk_rows
+        self.thread = threading.Thread(target=self.write_chunks, name="telemetry-writer", daemon=True)
+        self.thread.start()
+
+    def start_run(self, seed):
+        # Rows recorded from here on belong to a run on this seed
+        if self.row > self.start:
+            self.submit()
+        self.seed = seed
+
+    def record(self, world, gas, brake):
+        # Store the state after one physics step
+        car = world.car
+        columns = self.columns
+        i = self.row
+        columns[0][i] = world.steps
+        columns[1][i] = (GAS if gas else 0) | (BRAKE if brake else 0)
+        columns[2][i] = car.x
+        columns[3][i] = car.y
+        columns[4][i] = car.angle
+        columns[5][i] = car.angular_velocity
+        columns[6][i] = car.speed
+        columns[7][i] = car.fuel
+        columns[8][i], columns[9][i], columns[10][i] = get_wheel_row(car.back_wheel)
+        columns[11][i], columns[12][i], columns[13][i] = get_wheel_row(car.front_wheel)
+        columns[14][i] = car.coins_collected
+        events = 0
+        for event in world.events:
+            events |= EVENT_BITS[event]
+        columns[15][i] = events
+
+        self.row = i + 1
+        if self.row == self.end:
+            self.submit()
+
+    def submit(self):
+        # Hand the chunk being filled to the writer and move on to the next free one
+        self.queue.put((self.seed, self.start, self.row))
+        self.free.acquire()
+        self.start = self.end % (self.chunk_rows * self.chunks)
+        self.row = self.start
+        self.end = self.start + self.chunk_rows
+
+    def write_chunks(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            seed, start, stop = item
+            try:
+                if self.error is None:
+                    self.write_chunk(seed, start, stop)
+                    self.written += stop - start
+            except OSError as error:
+                self.error = error
+            self.free.release()
+
+    def write_chunk(self, seed, start, stop):
+        if self.format == "csv":
+            formats = ["{}"] + [CSV_FORMATS.get(typecode, "{}") for _, typecode in COLUMNS]
+            row_format = ",".join(formats) + "\n"
+            values = [column[start:stop] for column in self.columns]
+            self.file.write("".join(row_format.format(seed, *row) for row in zip(*values)))
+            return
+
+        self.file.write(CHUNK.pack(seed, stop - start))
+        for column in self.columns:
+            if sys.byteorder == "little":
+                self.file.write(memoryview(column)[start:stop])
+            else:
+                values = column[start:stop]
+                values.byteswap()
+                self.file.write(values)
+
+    def close(self):
+        # Write out every recorded row and return how many were written
+        if self.row > self.start:
+            self.queue.put((self.seed, self.start, self.row))
+        self.queue.put(None)
+        self.thread.join()
+        self.file.close()
+        if self.error is not None:
+            raise self.error
+        return self.written
+
+def load_telemetry(path):
+    # Read a binary telemetry file into one array per column, with the seed of every row under "seed"
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path} is not a telemetry file")
+    magic, version, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a telemetry file")
+    if version != VERSION:
+        raise ValueError(f"{path} is telemetry version {version}, expected {VERSION}")
+
+    offset = HEADER.size
+    names = []
+    columns = {"seed": array("Q")}
+    for _ in range(count):
+        name, typecode = COLUMN.unpack_from(data, offset)
+        offset += COLUMN.size
+        names.append(name.rstrip(b"\0").decode())
+        columns[names[-1]] = array(typecode.decode())
+
+    while offset < len(data):
+        if offset + CHUNK.size > len(data):
+            raise ValueError(f"{path} is truncated")
+        seed, rows = CHUNK.unpack_from(data, offset)
+        offset += CHUNK.size
+        columns["seed"].extend([seed] * rows)
+        for name in names:
+            column = columns[name]
+            size = column.itemsize * rows
+            if offset + size > len(data):
+                raise ValueError(f"{path} is truncated")
+            values = array(column.typecode, data[offset:offset + size])
+            if sys.byteorder != "little":
+                values.byteswap()
+            column.extend(values)
+            offset += size
+    return columns
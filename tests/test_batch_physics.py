@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from batch_physics import BatchCars
+from hill_climb import Terrain, World
+
+STEPS = 600
+
+def scalar_run(seed, params, inputs):
+    # One Car per run, stepped through World like the game, recording its state after every step
+    world = World(seed)
+    car = world.car
+    for name, value in params.items():
+        if name in ("spring_strength", "damping"):
+            setattr(car.back_wheel, name, value)
+            setattr(car.front_wheel, name, value)
+        else:
+            setattr(car, name, value)
+    states = []
+    for gas, brake in inputs:
+        world.step(gas, brake)
+        states.append((car.x, car.y, car.angle, car.fuel, car.score))
+        if world.game_over:
+            break
+    return states
+
+def check_batch(seed, params, inputs, count):
+    # inputs is (steps, count, 2); params maps a name to one value or one per car
+    cars = BatchCars(count, Terrain(seed=seed))
+    for name, value in params.items():
+        setattr(cars, name, value)
+    runs = [scalar_run(seed, {name: np.broadcast_to(value, count)[i] for name, value in params.items()},
+                       inputs[:, i]) for i in range(count)]
+    for step in range(len(inputs)):
+        live = ~cars.done
+        cars.step(inputs[step, :, 0], inputs[step, :, 1])
+        for i in np.flatnonzero(live):
+            assert step < len(runs[i])
+            expected = runs[i][step]
+            actual = (cars.x[i], cars.y[i], cars.angle[i], cars.fuel[i], cars.score[i])
+            assert actual == pytest.approx(expected, rel=1e-9, abs=1e-9), (i, step)
+        if cars.done.all():
+            break
+
+def random_inputs(seed, count):
+    rng = np.random.default_rng(seed)
+    gas = rng.random((STEPS, count)) < 0.8
+    brake = rng.random((STEPS, count)) < 0.05
+    return np.stack([gas, brake], axis=2)
+
+@pytest.mark.parametrize("seed", [7, 8])
+def test_batch_matches_scalar_cars(seed):
+    check_batch(seed, {}, random_inputs(seed, 4), 4)
+
+@pytest.mark.parametrize("count", [2, 5])
+def test_per_car_parameters_match_scalar_cars(count):
+    params = {
+        "spring_strength": np.linspace(0.1, 0.6, count),
+        "damping": np.linspace(0.3, 0.9, count),
+        "friction": np.linspace(0.95, 0.99, count),
+        "max_speed": np.linspace(8, 14, count),
+    }
+    check_batch(3, params, random_inputs(count, count), count)
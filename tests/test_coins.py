@@ -0,0 +1,29 @@
+from hill_climb import World
+
+def coin_ids(world):
+    return {(coin.chunk, coin.slot) for bucket in world.coins.buckets.values() for coin in bucket}
+
+def test_missed_coins_come_back_when_driving_back():
+    world = World(0)
+    for _ in range(1500):
+        world.step(True, False)
+    assert world.first_coin_chunk > 0
+    collected = dict(world.coins.collected)
+
+    world.stream(0)
+    expected = {(coin.chunk, coin.slot) for index in range(world.coin_chunk) for coin in world.chunk_coins(index)
+                if not collected.get(index, 0) >> coin.slot & 1}
+    assert coin_ids(world) == expected
+
+def test_collected_coins_stay_collected():
+    world = World(0)
+    for _ in range(1500):
+        world.step(True, False)
+    score = world.car.score
+    assert score > 0
+
+    world.stream(0)
+    collected = {(chunk, slot) for chunk, mask in world.coins.collected.items()
+                 for slot in range(mask.bit_length()) if mask >> slot & 1}
+    assert len(collected) * 10 == score
+    assert not collected & coin_ids(world)
@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+from hill_climb import MAX_COIN_CHUNKS, World
+
+def drive(world, steps, seed=0):
+    # Mostly gas with the odd brake, the same inputs for the same seed
+    rng = random.Random(seed)
+    for _ in range(steps):
+        world.step(rng.random() < 0.9, rng.random() < 0.05)
+
+def state(world):
+    car = world.car
+    coins = sorted((coin.chunk, coin.slot) for bucket in world.coins.buckets.values() for coin in bucket)
+    return (world.steps, world.end_reason, car.pose(), car.fuel, car.score, car.distance, coins)
+
+def test_restore_in_same_world_repeats_the_run():
+    world = World(5)
+    drive(world, 300)
+    snapshot = world.snapshot()
+    drive(world, 600, seed=1)
+    expected = state(world)
+
+    world.restore(snapshot)
+    drive(world, 600, seed=1)
+    assert state(world) == expected
+
+def test_restore_in_fresh_world_matches_the_original():
+    world = World(5)
+    drive(world, 1500)
+    snapshot = world.snapshot()
+    drive(world, 300, seed=1)
+    expected = state(world)
+
+    fresh = World(5)
+    fresh.restore(snapshot)
+    drive(fresh, 300, seed=1)
+    assert state(fresh) == expected
+
+def test_restore_rejects_another_seed():
+    world = World(5)
+    drive(world, 10)
+    with pytest.raises(ValueError):
+        World(6).restore(world.snapshot())
+
+def test_placed_coins_stay_bounded():
+    world = World(5)
+    world.car.fuel_consumption = 0
+    drive(world, 5000)
+    assert world.coin_chunk > 20
+    assert len(world.coin_cache) <= MAX_COIN_CHUNKS
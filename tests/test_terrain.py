@@ -0,0 +1,42 @@
+import pytest
+
+import hill_climb
+from hill_climb import Terrain
+
+def count_generated(terrain):
+    calls = []
+    generate_chunk = terrain.generate_chunk
+    terrain.generate_chunk = lambda index: calls.append(index) or generate_chunk(index)
+    return calls
+
+def test_sequential_lookups_generate_each_chunk_once():
+    terrain = Terrain(seed=1)
+    calls = count_generated(terrain)
+    for x in range(0, 40000, 5):
+        terrain.get_height(x)
+    assert calls == list(range(20))
+
+def test_streaming_evicts_chunks_behind_the_camera():
+    terrain = Terrain(seed=1)
+    for camera_x in range(0, 40000, 100):
+        terrain.stream(camera_x)
+        terrain.get_height(camera_x + 400)
+    assert len(terrain.chunks) <= terrain.max_chunks
+    assert min(terrain.chunks) >= terrain.active_chunk - terrain.max_chunks
+    assert terrain.active_chunk in terrain.chunks
+
+@pytest.mark.parametrize("seed", [1, 42, 2 ** 32 - 1])
+@pytest.mark.parametrize("octaves", [0, 3])
+def test_numpy_generation_matches_the_loop(monkeypatch, seed, octaves):
+    # Replays depend on the NumPy path giving the same heights as the plain loop, bit for bit
+    vectorized = Terrain(seed=seed, octaves=octaves)
+    chunks = [vectorized.generate_chunk(index) for index in (0, 1, 17)]
+
+    monkeypatch.setattr(hill_climb, "np", None)
+    looped = Terrain(seed=seed, octaves=octaves)
+    for chunk in chunks:
+        expected = looped.generate_chunk(chunk.index)
+        assert chunk.heights.tobytes() == expected.heights.tobytes()
+        assert chunk.checkpoints == expected.checkpoints
+        assert list(chunk.slopes) == pytest.approx(list(expected.slopes))
+        assert list(chunk.normals) == pytest.approx(list(expected.normals))
@@ -0,0 +1,62 @@
+import mmap
+import sys
+import struct
+from array import array
+
+# File layout: header, then one float32 height per point, then int32 checkpoint x positions
+# Heights start on a 32-byte boundary and x is implicit, point i sitting at i * segment_length
+MAGIC = b"BRTK"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQQI4x")  # magic, version, segment length, seed, point count, checkpoint count
+HEADER_SIZE = 32
+
+class Track:
+    def __init__(self, heights, checkpoints, segment_length, seed, mapping=None):
+        self.heights = heights  # Sequence of float heights, a memoryview straight into the file when loaded
+        self.checkpoints = checkpoints  # x positions of the mountain peaks
+        self.segment_length = segment_length
+        self.seed = seed
+        self.mapping = mapping  # The memory map the heights point into
+
+    @property
+    def width(self):
+        return (len(self.heights) - 1) * self.segment_length
+
+def save_track(path, heights, checkpoints, segment_length, seed):
+    heights = array("f", heights)
+    checkpoints = array("i", checkpoints)
+    if sys.byteorder != "little":
+        heights.byteswap()
+        checkpoints.byteswap()
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, segment_length, seed, len(heights), len(checkpoints)).ljust(HEADER_SIZE, b"\0"))
+        f.write(heights.tobytes())
+        f.write(checkpoints.tobytes())
+
+def load_track(path):
+    # Map the file instead of reading it, so heights are paged in on demand and shared between processes
+    with open(path, "rb") as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(mapping) < HEADER_SIZE:
+        raise ValueError(f"{path} is not a track file")
+    magic, version, segment_length, seed, count, checkpoint_count = HEADER.unpack_from(mapping)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a track file")
+    if version != VERSION:
+        raise ValueError(f"{path} is track version {version}, expected {VERSION}")
+    checkpoint_start = HEADER_SIZE + 4 * count
+    if len(mapping) < checkpoint_start + 4 * checkpoint_count or count < 2:
+        raise ValueError(f"{path} is truncated")
+
+    checkpoints = array("i", mapping[checkpoint_start:checkpoint_start + 4 * checkpoint_count])
+    if sys.byteorder == "little":
+        heights = memoryview(mapping)[HEADER_SIZE:checkpoint_start].cast("f")
+    else:
+        # The file is little-endian, so big-endian machines pay for a copy
+        heights = array("f", mapping[HEADER_SIZE:checkpoint_start])
+        heights.byteswap()
+        checkpoints.byteswap()
+
+    return Track(heights, list(checkpoints), segment_length, seed, mapping)
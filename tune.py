@@ -0,0 +1,198 @@
+import os
+import json
+import math
+import random
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # One banner per worker process adds up
+
+from hill_climb import World
+
+# Tunable handling parameters: (default, lowest, highest)
+PARAMETERS = {
+    "spring_strength": (0.3, 0.05, 0.8),
+    "damping": (0.6, 0.1, 0.95),
+    "angular_damping": (0.1, 0.01, 0.5),
+    "max_speed": (10, 5, 20),
+    "fuel_consumption": (0.1, 0.05, 0.3),
+    "friction": (0.98, 0.9, 0.999),
+}
+WHEEL_PARAMETERS = {"spring_strength", "damping"}  # Set on both wheels rather than the car
+
+# A candidate's fitness is the meters it drives plus these weights times the other metrics
+EFFICIENCY_WEIGHT = 20  # Per meter driven per unit of fuel burnt at the default consumption
+STABILITY_WEIGHT = 20  # Taken off per degree of RMS difference between the body and the ground under it
+
+def apply_params(car, params):
+    for name, value in params.items():
+        if name in WHEEL_PARAMETERS:
+            setattr(car.back_wheel, name, value)
+            setattr(car.front_wheel, name, value)
+        else:
+            setattr(car, name, value)
+
+def run(params, seed, steps):
+    # Drive flat out over one seeded terrain and measure how it went
+    world = World(seed)
+    car = world.car
+    apply_params(car, params)
+    start_x = car.x
+    # Fuel is counted at the default consumption, so a car is judged on how far it gets per step of
+    # gas rather than on how little fuel_consumption itself is
+    default_consumption = PARAMETERS["fuel_consumption"][0]
+    fuel_burnt = 0.0
+    angle_error = 0.0
+    for step in range(steps):
+        if car.fuel > 0:
+            fuel_burnt += default_consumption
+        world.step(True, False)
+
+        # How far the body is from lying along the ground between its wheels
+        back, front = car.back_wheel.x, car.front_wheel.x
+        ground_angle = math.atan2(world.terrain.get_height(front) - world.terrain.get_height(back), front - back)
+        angle_error += (car.angle - ground_angle) ** 2
+        if world.game_over:
+            break
+
+    distance = (car.max_distance - start_x) * 0.1  # Meters, as on the HUD
+    return {
+        "distance": distance,
+        "efficiency": distance / fuel_burnt if fuel_burnt else 0.0,
+        "angle_rms": math.degrees(math.sqrt(angle_error / (step + 1))),
+        "score": car.score,
+    }
+
+def evaluate(params, seeds, steps):
+    # Average the metrics over every terrain and combine them into one score
+    runs = [run(params, seed, steps) for seed in seeds]
+    metrics = {name: sum(r[name] for r in runs) / len(runs) for name in runs[0]}
+    fitness = (metrics["distance"] + EFFICIENCY_WEIGHT * metrics["efficiency"]
+               - STABILITY_WEIGHT * metrics["angle_rms"])
+    return {"params": params, "metrics": metrics, "fitness": fitness}
+
+def key(params):
+    return json.dumps(params, sort_keys=True)
+
+def clean(params):
+    # Round so the same candidate always gets the same checkpoint key
+    return {name: round(value, 4) for name, value in params.items()}
+
+class Search:
+    # Evaluates candidates across a process pool, remembering every result in a checkpoint
+    # Every strategy is deterministic for its seed, so resuming replays it with the saved results
+    # standing in for the runs already done
+    def __init__(self, pool, settings, checkpoint=None):
+        self.pool = pool
+        self.settings = settings
+        self.checkpoint = checkpoint
+        self.results = {}
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                saved = json.load(f)
+            if saved["settings"] != settings:
+                raise ValueError(f"{checkpoint} was written by a search with different settings")
+            self.results = {key(result["params"]): result for result in saved["results"]}
+            print(f"resuming with {len(self.results)} evaluated candidates")
+
+    def evaluate(self, candidates):
+        # Return the results for candidates, running the ones not seen before
+        candidates = [clean(params) for params in candidates]
+        todo = list({key(params): params for params in candidates if key(params) not in self.results}.values())
+        if todo:
+            count = len(todo)
+            seeds = [self.settings["seeds"]] * count
+            steps = [self.settings["steps"]] * count
+            for result in self.pool.map(evaluate, todo, seeds, steps):
+                self.results[key(result["params"])] = result
+            self.save()
+        return [self.results[key(params)] for params in candidates]
+
+    def save(self):
+        if not self.checkpoint:
+            return
+        # Write to a temporary file first so an interrupted save can't lose the checkpoint
+        temporary = self.checkpoint + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump({"settings": self.settings, "results": list(self.results.values())}, f, indent=1)
+        os.replace(temporary, self.checkpoint)
+
+    def best(self, count=5):
+        return sorted(self.results.values(), key=lambda result: -result["fitness"])[:count]
+
+def defaults(names):
+    return {name: PARAMETERS[name][0] for name in names}
+
+def random_params(names, rng):
+    return {name: rng.uniform(PARAMETERS[name][1], PARAMETERS[name][2]) for name in names}
+
+def grid_search(search, names, levels, batch):
+    # Every combination of evenly spaced values across each parameter's range
+    values = [[low + (high - low) * i / (levels - 1) for i in range(levels)]
+              for _, low, high in (PARAMETERS[name] for name in names)]
+    combinations = [dict(zip(names, combination)) for combination in itertools.product(*values)]
+    for start in range(0, len(combinations), batch):
+        search.evaluate(combinations[start:start + batch])
+        print(f"grid {min(start + batch, len(combinations))}/{len(combinations)}")
+
+def random_search(search, names, samples, batch, rng):
+    candidates = [defaults(names)] + [random_params(names, rng) for _ in range(samples - 1)]
+    for start in range(0, len(candidates), batch):
+        search.evaluate(candidates[start:start + batch])
+        print(f"random {min(start + batch, len(candidates))}/{len(candidates)}")
+
+def evolve(search, names, population, generations, rng, mutation=0.1):
+    # Keep the best quarter of each generation and fill the rest with mutated copies of them
+    candidates = [defaults(names)] + [random_params(names, rng) for _ in range(population - 1)]
+    for generation in range(generations):
+        results = sorted(search.evaluate(candidates), key=lambda result: -result["fitness"])
+        print(f"generation {generation + 1}/{generations}  best {results[0]['fitness']:.1f}")
+
+        parents = [result["params"] for result in results[:max(1, population // 4)]]
+        candidates = list(parents)
+        while len(candidates) < population:
+            child = dict(rng.choice(parents))
+            for name in names:
+                _, low, high = PARAMETERS[name]
+                child[name] = min(high, max(low, child[name] + rng.gauss(0, mutation * (high - low))))
+            candidates.append(child)
+
+def main():
+    parser = argparse.ArgumentParser(description="Search for car and suspension parameters that drive best")
+    parser.add_argument("strategy", choices=["grid", "random", "evolve"])
+    parser.add_argument("--params", nargs="+", choices=list(PARAMETERS), default=list(PARAMETERS),
+                        help="parameters to tune; the rest keep their defaults")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1, 2, 3, 4], help="terrains every candidate drives")
+    parser.add_argument("--steps", type=int, default=1800, help="most physics steps per run")
+    parser.add_argument("--levels", type=int, default=3, help="grid values per parameter")
+    parser.add_argument("--samples", type=int, default=200, help="candidates tried by random search")
+    parser.add_argument("--population", type=int, default=32, help="candidates per generation")
+    parser.add_argument("--generations", type=int, default=20)
+    parser.add_argument("--search-seed", type=int, default=0, help="seed for the random and evolutionary searches")
+    parser.add_argument("--workers", type=int, help="processes to run (default: one per core)")
+    parser.add_argument("--checkpoint", metavar="PATH", help="save results to PATH and resume from it if it exists")
+    args = parser.parse_args()
+
+    settings = {"seeds": args.seeds, "steps": args.steps}
+    rng = random.Random(args.search_seed)
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        search = Search(pool, settings, args.checkpoint)
+        batch = 4 * (args.workers or os.cpu_count() or 1)  # Checkpoint after every batch
+        if args.strategy == "grid":
+            grid_search(search, args.params, max(2, args.levels), batch)
+        elif args.strategy == "random":
+            random_search(search, args.params, args.samples, batch, rng)
+        else:
+            evolve(search, args.params, args.population, args.generations, rng)
+
+    print()
+    print(f"{'fitness':>9} {'distance':>9} {'m/fuel':>7} {'angle':>6}  parameters")
+    for result in search.best():
+        metrics = result["metrics"]
+        params = "  ".join(f"{name}={value:g}" for name, value in result["params"].items())
+        print(f"{result['fitness']:9.1f} {metrics['distance']:8.0f}m {metrics['efficiency']:7.2f} "
+              f"{metrics['angle_rms']:5.1f}°  {params}")
+
+if __name__ == "__main__":
+    main()